@@ -0,0 +1,116 @@
+"""An in-memory stand-in for OpenOrchestrator's OrchestratorConnection, used by the offline benchmark.
+
+Queue elements are real QueueElement objects kept in a list, so the robot sees the same types as in production.
+Constants and credentials come from dicts, and log messages are collected in memory.
+"""
+
+import threading
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+from OpenOrchestrator.database.queues import QueueElement, QueueStatus
+
+
+# pylint: disable-next = too-many-instance-attributes
+class FakeOrchestratorConnection:
+    """Implements the part of OrchestratorConnection the robot uses."""
+
+    def __init__(self, process_arguments: str, constants: dict[str, str], credentials: dict[str, tuple[str, str]],
+                 verbose: bool = False):
+        self.process_name = "benchmark"
+        self.process_arguments = process_arguments
+        self.constants = constants
+        self.credentials = credentials
+        self.verbose = verbose
+        self.logs: list[tuple[str, str]] = []
+        self._elements: list[QueueElement] = []
+        self._lock = threading.Lock()
+
+    # Logging
+
+    def log_trace(self, message: str) -> None:
+        """Collect a trace message."""
+        self._log("trace", message)
+
+    def log_info(self, message: str) -> None:
+        """Collect an info message."""
+        self._log("info", message)
+
+    def log_error(self, message: str) -> None:
+        """Collect an error message."""
+        self._log("error", message)
+
+    # Constants and credentials
+
+    def get_constant(self, constant_name: str):
+        """Get a constant as an object with a value."""
+        return SimpleNamespace(name=constant_name, value=self.constants[constant_name])
+
+    def get_credential(self, credential_name: str):
+        """Get a credential as an object with a username and a password."""
+        username, password = self.credentials[credential_name]
+        return SimpleNamespace(name=credential_name, username=username, password=password)
+
+    # Queues
+
+    def create_queue_element(self, queue_name: str, reference: str | None = None, data: str | None = None,
+                             created_by: str | None = None) -> QueueElement:
+        """Add a new element to a queue."""
+        element = QueueElement(
+            id=uuid.uuid4(), queue_name=queue_name, status=QueueStatus.NEW, data=data, reference=reference,
+            created_date=datetime.now(), created_by=created_by
+        )
+        with self._lock:
+            self._elements.append(element)
+        return element
+
+    def get_next_queue_element(self, queue_name: str, reference: str | None = None, set_status: bool = True) -> QueueElement | None:
+        """Get the oldest new element of a queue and set it in progress."""
+        with self._lock:
+            for element in self._elements:
+                if element.queue_name == queue_name and element.status == QueueStatus.NEW and reference in (None, element.reference):
+                    if set_status:
+                        element.status = QueueStatus.IN_PROGRESS
+                        element.start_date = datetime.now()
+                    return element
+        return None
+
+    def get_queue_elements(self, queue_name: str, reference: str | None = None, status: QueueStatus | None = None,
+                           offset: int = 0, limit: int = 100, from_date: datetime | None = None,
+                           to_date: datetime | None = None) -> tuple[QueueElement, ...]:
+        """Get the elements of a queue, optionally filtered by reference, status and creation date."""
+        def matches(element: QueueElement) -> bool:
+            if element.queue_name != queue_name or reference not in (None, element.reference) or status not in (None, element.status):
+                return False
+            return (from_date is None or element.created_date >= from_date) and (to_date is None or element.created_date <= to_date)
+
+        with self._lock:
+            elements = [element for element in self._elements if matches(element)]
+        return tuple(elements[offset:offset + limit])
+
+    def set_queue_element_status(self, element_id: str, status: QueueStatus, message: str | None = None) -> None:
+        """Set the status of an element, and its start or end date as OpenOrchestrator does."""
+        with self._lock:
+            element = next(element for element in self._elements if str(element.id) == str(element_id))
+            element.status = status
+            element.message = message
+            if status == QueueStatus.IN_PROGRESS:
+                element.start_date = datetime.now()
+            elif status in (QueueStatus.DONE, QueueStatus.FAILED):
+                element.end_date = datetime.now()
+
+    def status_counts(self, queue_name: str) -> dict[str, int]:
+        """Count the elements of a queue by status."""
+        counts: dict[str, int] = {}
+        with self._lock:
+            for element in self._elements:
+                if element.queue_name == queue_name:
+                    counts[element.status.name] = counts.get(element.status.name, 0) + 1
+        return counts
+
+    def _log(self, level: str, message: str) -> None:
+        with self._lock:
+            self.logs.append((level, message))
+        if self.verbose or level == "error":
+            print(f"[{level}] {message}")
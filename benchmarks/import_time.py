@@ -0,0 +1,72 @@
+"""Measure the import time of the robot framework with `python -X importtime`.
+
+Run from the repository root:
+    python benchmarks/import_time.py [--top N] [--module robot_framework.queue_framework]
+
+Prints the total import time, the slowest top level imports by cumulative time and
+whether the heavy dependencies were imported at start-up. The summary from the last
+measurement is kept in benchmarks/import_time.txt.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Dependencies that should only be loaded when they are used.
+HEAVY_MODULES = ("pandas", "PIL", "selenium", "pyodbc", "requests", "mbu_dev_shared_components")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def measure(module: str) -> list[tuple[int, int, str]]:
+    """Import a module in a fresh interpreter and parse the -X importtime output.
+
+    Returns:
+        A list of (self µs, cumulative µs, module name) in import order, with the module
+        name indented by its nesting level as printed by python.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+
+def summarize(module: str, rows: list[tuple[int, int, str]], top: int) -> str:
+    """Format the total, the slowest imports and the heavy modules that were loaded."""
+    total = next(cumulative for _, cumulative, name in rows if name.strip() == module)
+    loaded = {name.strip() for _, _, name in rows}
+    # python indents a nested import by two spaces per level.
+    nested = [(cumulative, name.strip()) for _, cumulative, name in rows
+              if name.strip() != module and (len(name) - len(name.lstrip()) - 1) // 2 <= 2]
+
+    lines = [f"import {module}: {total / 1000:.1f} ms", "", "Slowest imports (cumulative, up to two levels deep):"]
+    for cumulative, name in sorted(nested, reverse=True)[:top]:
+        lines.append(f"  {cumulative / 1000:8.1f} ms  {name}")
+    lines.append("")
+    lines.append("Heavy dependencies imported at start-up:")
+    for name in HEAVY_MODULES:
+        lines.append(f"  {name}: {'yes' if name in loaded else 'no'}")
+    return "\n".join(lines)
+
+
+def main():
+    """Run the benchmark and print the summary."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="robot_framework.queue_framework")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    print(summarize(args.module, measure(args.module), args.top))
+
+
+if __name__ == "__main__":
+    main()
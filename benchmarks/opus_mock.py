@@ -0,0 +1,256 @@
+"""A local replica of the KMD portal pages the robot touches, and an OS2Forms receipt stub, for the offline benchmark.
+
+The portal serves a logon page until the logon form has been posted, then the start page with the
+'Min Økonomi' menu. The outlay form is loaded in the 'contentAreaFrame' and 'ivuFrm_page0ivu0' frames,
+and its popups are opened in a 'URLSPW-0' frame in the top document, as in the real portal.
+The fields that are only reachable by absolute XPath are placed at exactly the paths in the selector registry.
+
+Every request is delayed by `latency` seconds, and the Hent, Kontroller, Opret and 'Nyt bilag' actions
+show a busy indicator for `roundtrip` seconds before their result appears.
+"""
+
+import re
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from robot_framework.subprocesses.opus_selectors import SELECTORS
+
+SESSION_COOKIE = "MYSAPSSO2"
+
+# A minimal valid PDF, served as every receipt.
+RECEIPT_PDF = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+# Field labels of the form, by input id. The robot finds these through their labels.
+FORM_FIELDS = {
+    "kreditor": "Kreditor",
+    "udbetalingstekst": "Udbetalingstekst",
+    "posteringstekst": "Posteringstekst",
+    "reference": "Reference",
+    "beloeb": "Beløb",
+    "naeste_agent": "Næste agent",
+}
+
+BUSY_INDICATOR = '<div id="busy" class="lsBusyIndicator" style="display:none">Behandler...</div>'
+
+ROUNDTRIP_SCRIPT = """
+<script>
+function roundtrip(action) {
+    const busy = document.getElementById('busy');
+    busy.style.display = 'block';
+    setTimeout(() => { busy.style.display = 'none'; action(); }, ROUNDTRIP_MS);
+}
+function openPopup(src) {
+    const frame = top.document.createElement('iframe');
+    frame.id = 'URLSPW-0';
+    frame.src = src;
+    frame.style = 'position:fixed; top:100px; left:100px; width:600px; height:400px; background:white;';
+    top.document.body.appendChild(frame);
+}
+function closePopup() {
+    top.document.getElementById('URLSPW-0').remove();
+}
+function formWindow() {
+    return top.document.getElementById('contentAreaFrame').contentWindow
+        .document.getElementById('ivuFrm_page0ivu0').contentWindow;
+}
+</script>
+"""
+
+
+def xpath_tree(paths: dict[str, str]) -> str:
+    """Build the HTML of a body that has an element at each absolute XPath.
+
+    Args:
+        paths: The inner HTML of each leaf element by its absolute XPath, e.g. '/html/body/table/tbody/tr[2]/td'.
+            Missing preceding siblings are filled with empty elements.
+    """
+    root: dict = {}
+    leaves: dict[int, str] = {}
+    for path, inner in paths.items():
+        node = root
+        for step in path.removeprefix("/html/body/").strip("/").split("/"):
+            match = re.fullmatch(r"(\w+)(?:\[(\d+)\])?", step)
+            key = (match.group(1), int(match.group(2) or 1))
+            node = node.setdefault(key, {})
+        leaves[id(node)] = inner
+
+    def render(node: dict) -> str:
+        if id(node) in leaves:
+            return leaves[id(node)]
+        html = []
+        for tag in dict.fromkeys(tag for tag, _ in node):
+            for position in range(1, max(index for t, index in node if t == tag) + 1):
+                child = node.get((tag, position))
+                html.append(f"<{tag}>{render(child) if child is not None else ''}</{tag}>")
+        return "".join(html)
+
+    return render(root)
+
+
+def _xpath(name: str) -> str:
+    """The absolute XPath strategy of a name in the selector registry."""
+    return next(value for by, value in SELECTORS[name] if by == "xpath" and value.startswith("/html/body/"))
+
+
+def logon_page() -> str:
+    """The portal's logon page."""
+    return """<html><body>
+    <form method="post" action="/irj/portal/logon">
+        <input id="logonuidfield" name="user"><input id="logonpassfield" name="password" type="password">
+        <button id="buttonLogon" type="submit">Log on</button>
+    </form></body></html>"""
+
+
+def portal_page() -> str:
+    """The portal's start page with the menu leading to the outlay form."""
+    submenu = xpath_tree({_xpath("udgiftsbilag"): '<span onclick="openContent()">Udgiftsbilag</span>'})
+    return f"""<html><body>
+    <div id="submenu" style="display:none">{submenu.removeprefix('<div>').removesuffix('</div>')}</div>
+    <div onclick="show('bilag')">Min Økonomi</div>
+    <div id="bilag" style="display:none" onclick="show('submenu')">Bilag og fakturaer</div>
+    <div id="content"></div>
+    <script>
+    function show(id) {{ document.getElementById(id).style.display = 'block'; }}
+    function openContent() {{
+        document.getElementById('content').innerHTML =
+            '<iframe id="contentAreaFrame" src="/opus/content" style="width:100%; height:900px"></iframe>';
+    }}
+    </script>
+    </body></html>"""
+
+
+def content_page() -> str:
+    """The content area, which holds the form frame."""
+    return '<html><body><iframe id="ivuFrm_page0ivu0" src="/opus/form" style="width:100%; height:880px"></iframe></body></html>'
+
+
+def form_page(roundtrip: float) -> str:
+    """The outlay form."""
+    tree = xpath_tree({
+        _xpath("udbetalingstekst_detaljer"): "<div onclick=\"openPopup('/opus/popup/text')\">...</div>",
+        _xpath("artskonto_celle"): "<span onclick=\"document.getElementById('grid0').focus()\">Artskonto</span>",
+    })
+    fields = "".join(f'<div><label for="{field}">{escape(label)}</label><input id="{field}"></div>' for field, label in FORM_FIELDS.items())
+    grid = "".join(f'<input id="grid{i}">' for i in range(6))
+    buttons = {
+        "Hent": "roundtrip(() => {})",
+        "Vedhæft nyt": "openPopup('/opus/popup/attach')",
+        "Kontroller": "roundtrip(() => message(document.getElementById('kreditor').value && window.attached "
+                      "? 'Udgiftsbilag er kontrolleret og OK' : 'Udgiftsbilag indeholder fejl'))",
+        "Opret": "roundtrip(() => message('Udgiftsbilag ' + Math.floor(Math.random() * 1e6) + ' er oprettet'))",
+        "Nyt bilag": "roundtrip(() => { document.querySelectorAll('input').forEach(i => i.value = ''); "
+                     "window.attached = false; message(''); })",
+    }
+    toolbar = "".join(f'<div class="lsButton" title="{escape(text)}" onclick="{escape(action)}">{escape(text)}</div>' for text, action in buttons.items())
+    return f"""<html><body>{tree}
+    <div>{fields}</div><div>{grid}</div><div>{toolbar}</div><div id="message"></div>{BUSY_INDICATOR}
+    {ROUNDTRIP_SCRIPT.replace('ROUNDTRIP_MS', str(int(roundtrip * 1000)))}
+    <script>function message(text) {{ document.getElementById('message').textContent = text; }}</script>
+    </body></html>"""
+
+
+def text_popup() -> str:
+    """The popup for the payment text details, which takes the text typed at the cursor."""
+    return f"""<html><body onload="document.querySelector('textarea').focus()"><textarea></textarea>
+    <div class="lsButton" title="Gem" onclick="closePopup()">Gem</div>{ROUNDTRIP_SCRIPT.replace('ROUNDTRIP_MS', '0')}</body></html>"""
+
+
+def attach_popup() -> str:
+    """The popup for attaching a file."""
+    return f"""<html><body><input type="file" style="display:none">
+    <div class="lsButton" title="OK" onclick="formWindow().attached = true; closePopup()">OK</div>
+    {BUSY_INDICATOR}{ROUNDTRIP_SCRIPT.replace('ROUNDTRIP_MS', '0')}</body></html>"""
+
+
+class MockServer:
+    """Serves the portal replica and the OS2Forms stub on a local port in a background thread."""
+
+    def __init__(self, latency: float = 0.0, roundtrip: float = 0.3, api_key: str = "benchmark", port: int = 0):
+        self.latency = latency
+        self.roundtrip = roundtrip
+        self.api_key = api_key
+        self.requests = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """The base URL of the server."""
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockServer":
+        """Start serving."""
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Routes the portal pages and receipt downloads."""
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Serve a page or a receipt."""
+                path = urlparse(self.path).path
+                self._delay()
+                if path.startswith("/os2forms/receipt/"):
+                    if self.headers.get("api-key") != server.api_key:
+                        self._send(401, b"Unauthorized", "text/plain")
+                    else:
+                        self._send(200, RECEIPT_PDF, "application/pdf")
+                    return
+
+                pages = {
+                    "/opus/content": content_page,
+                    "/opus/form": lambda: form_page(server.roundtrip),
+                    "/opus/popup/text": text_popup,
+                    "/opus/popup/attach": attach_popup,
+                }
+                if path == "/irj/portal":
+                    page = portal_page() if SESSION_COOKIE in self.headers.get("Cookie", "") else logon_page()
+                elif path in pages:
+                    page = pages[path]()
+                else:
+                    self._send(404, b"Not found", "text/plain")
+                    return
+                self._send(200, page.encode("utf-8"), "text/html; charset=utf-8")
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                """Accept any logon and start a session."""
+                self._delay()
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self.send_response(303)
+                self.send_header("Set-Cookie", f"{SESSION_COOKIE}=benchmark; Path=/")
+                self.send_header("Location", "/irj/portal")
+                self.end_headers()
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                """Keep the benchmark output quiet."""
+
+            def _delay(self):
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
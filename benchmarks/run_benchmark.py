@@ -0,0 +1,149 @@
+"""Run the robot end to end against the local OPUS replica and OS2Forms stub, and report its throughput.
+
+Run from the repository root (Chrome must be installed):
+    python -m benchmarks.run_benchmark [--elements 20] [--workers 1] [--latency 0.05] [--roundtrip 0.3] [--baseline]
+
+The run uses:
+- opus_mock.MockServer for the portal pages and the receipt downloads.
+- fake_orchestrator.FakeOrchestratorConnection as the queue, constants and credentials.
+- A generated workbook with a row per element.
+- Headless Chrome.
+The journalizing database is replaced by a recorder of the statuses the robot would have written.
+queue_framework.main runs unchanged, and the benchmark prints elements/minute and the run's stage summary.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import uuid
+from unittest import mock
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+
+from robot_framework import config, queue_framework
+from robot_framework.checkpoint import checkpoints
+from robot_framework.receipt_cache import receipts
+from robot_framework.status_writer import StatusWriter
+from robot_framework.timing import timings
+from benchmarks.fake_orchestrator import FakeOrchestratorConnection
+from benchmarks.opus_mock import MockServer
+
+WORKBOOK_NAME = "benchmark.xlsx"
+
+
+def build_queue(orchestrator_connection: FakeOrchestratorConnection, server_url: str, directory: str, count: int) -> None:
+    """Create the workbook and a queue element per row, with an encrypted CPR number and a receipt URL on the stub."""
+    import pandas as pd
+    from robot_framework.element_record import get_encryptor
+
+    uuids = [str(uuid.uuid4()) for _ in range(count)]
+    pd.DataFrame({"uuid": uuids}).to_excel(os.path.join(directory, WORKBOOK_NAME), index=False)
+
+    encryptor = get_encryptor()
+    for i, element_uuid in enumerate(uuids):
+        data = {
+            "uuid": element_uuid,
+            "filename": WORKBOOK_NAME,
+            "attachment": f"{server_url}/os2forms/receipt/{element_uuid}",
+            "cpr_encrypted": encryptor.encrypt(f"{i:010d}").decode("utf-8"),
+            "beloeb": "123,45",
+            "psp": "XG-0000000000-00001",
+            "arts_konto": "40430002",
+            "posteringstekst": f"Kørsel {i}",
+            "reference": f"REF{i}",
+            "naeste_agent": "AZ00000",
+            "barnets_navn": "Barn Barnesen",
+        }
+        orchestrator_connection.create_queue_element(config.QUEUE_NAME, reference=element_uuid, data=json.dumps(data))
+
+
+# The browser profile before it was tuned, for comparison with --baseline.
+BASELINE_BROWSER = {
+    "BROWSER_PAGE_LOAD_STRATEGY": "normal",
+    "BROWSER_PROFILE_DIR": None,
+    "BROWSER_BLOCKED_URLS": (),
+    "BROWSER_WARM_START": False,
+}
+
+
+def run(elements: int, workers: int, latency: float, roundtrip: float, verbose: bool, baseline: bool = False) -> dict:
+    """Run the benchmark and return its results."""
+    server = MockServer(latency=latency, roundtrip=roundtrip).start()
+    written_statuses = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.setdefault("OPENORCHESTRATORKEY", "benchmark")
+        orchestrator_connection = FakeOrchestratorConnection(
+            process_arguments=json.dumps({"path": directory}),
+            constants={config.DB_CONNECTION_STRING: "benchmark", config.ERROR_EMAIL: "benchmark@localhost"},
+            credentials={config.OS2_API_CREDENTIAL: ("os2", server.api_key), config.OPUS_CREDENTIAL: ("robot", "secret")},
+            verbose=verbose,
+        )
+        build_queue(orchestrator_connection, server.url, directory, elements)
+
+        overrides = {
+            "OPUS_PORTAL_URL": f"{server.url}/irj/portal",
+            "BROWSER_HEADLESS": True,
+            "WORKER_COUNT": workers,
+            "MAX_TASK_COUNT": elements,
+            "RUN_SUMMARY_PATH": os.path.join(directory, "run_summaries.jsonl"),
+            "BROWSER_PROFILE_DIR": os.path.join(directory, "chrome_profiles"),
+        }
+        if baseline:
+            overrides.update(BASELINE_BROWSER)
+        with mock.patch.multiple(config, **overrides), \
+                mock.patch.object(OrchestratorConnection, "create_connection_from_args", return_value=orchestrator_connection), \
+                mock.patch.object(checkpoints, "path", os.path.join(directory, "checkpoints.jsonl")), \
+                mock.patch.object(receipts, "directory", os.path.join(directory, "receipt_cache")), \
+                mock.patch.object(StatusWriter, "_execute", lambda self, statuses: written_statuses.extend(statuses) or True):
+            start = time.perf_counter()
+            queue_framework.main()
+            elapsed = time.perf_counter() - start
+
+        summary = timings.summary()
+
+    server.stop()
+    counts = orchestrator_connection.status_counts(config.QUEUE_NAME)
+    return {
+        "elements": elements,
+        "workers": workers,
+        "latency": latency,
+        "roundtrip": roundtrip,
+        "baseline": baseline,
+        "elapsed": round(elapsed, 1),
+        "statuses": counts,
+        "elements_per_minute": round(counts.get("DONE", 0) * 60 / elapsed, 2),
+        "http_requests": server.requests,
+        "db_statuses": len(written_statuses),
+        "stages": summary["stages"],
+    }
+
+
+def main():
+    """Parse the arguments, run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--elements", type=int, default=20, help="The number of queue elements to process.")
+    parser.add_argument("--workers", type=int, default=1, help="The number of OPUS browser sessions.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every HTTP request.")
+    parser.add_argument("--roundtrip", type=float, default=0.3, help="Seconds the busy indicator shows for each portal action.")
+    parser.add_argument("--baseline", action="store_true", help="Use the untuned browser profile: normal page loads, incognito, "
+                        "nothing blocked and no warm start.")
+    parser.add_argument("--verbose", action="store_true", help="Print the robot's log.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    results = run(args.elements, args.workers, args.latency, args.roundtrip, args.verbose, args.baseline)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{results['statuses'].get('DONE', 0)}/{args.elements} elements done in {results['elapsed']}s: "
+          f"{results['elements_per_minute']} elements/minute ({results['statuses']}).")
+    for stage, stats in results["stages"].items():
+        print(f"  {stage:30} n={stats['count']:<4} p50={stats['p50']:.2f}s p95={stats['p95']:.2f}s max={stats['max']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,88 @@
 """The main file of the robot which will install all requirements in
 a virtual environment and then start the actual process.
+
+The virtual environment is only rebuilt when pyproject.toml or the lockfile changes.
+A hash of both is stored in the environment, and a matching hash means the existing
+environment is reused as is. A rebuild happens in a side directory which is swapped
+in when it is complete, so an interrupted rebuild never leaves a broken .venv behind.
+
+To update the lockfile after changing the dependencies in pyproject.toml, run:
+    uv pip compile pyproject.toml --python-platform windows --python-version 3.11 -o requirements.lock
 """
 
-import subprocess
+import hashlib
 import os
+import shutil
+import subprocess
 import sys
+import time
 
 script_directory = os.path.dirname(os.path.realpath(__file__))
 os.chdir(script_directory)
 
-# Install uv
-subprocess.run([sys.executable, "-m", "pip", "install", "uv"], check=True)
+VENV_DIR = ".venv"
+LOCKFILE = "requirements.lock"
+HASH_FILE = "requirements.sha256"
+HASHED_FILES = ("pyproject.toml", LOCKFILE)
+
+
+def venv_python(venv_dir: str) -> str:
+    """The path of the python executable in a virtual environment."""
+    if os.name == "nt":
+        return os.path.join(venv_dir, "Scripts", "python")
+    return os.path.join(venv_dir, "bin", "python")
+
+
+def requirements_hash() -> str:
+    """Hash the files that decide the content of the virtual environment."""
+    sha = hashlib.sha256()
+    for path in HASHED_FILES:
+        with open(path, "rb") as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+def venv_is_current(expected_hash: str) -> bool:
+    """Whether .venv exists and was built from the current requirements."""
+    hash_path = os.path.join(VENV_DIR, HASH_FILE)
+    if not os.path.exists(hash_path) or not os.path.exists(venv_python(VENV_DIR) + (".exe" if os.name == "nt" else "")):
+        return False
+    with open(hash_path, encoding="utf-8") as f:
+        return f.read().strip() == expected_hash
+
+
+def build_venv(new_hash: str) -> None:
+    """Build a virtual environment from the lockfile in a side directory and swap it in as .venv."""
+    side_dir = f"{VENV_DIR}-{new_hash[:12]}"
+    shutil.rmtree(side_dir, ignore_errors=True)
+
+    if shutil.which("uv") is None:
+        subprocess.run([sys.executable, "-m", "pip", "install", "uv"], check=True)
+
+    subprocess.run(["uv", "venv", side_dir], check=True)
+    subprocess.run(["uv", "pip", "install", "--python", venv_python(side_dir), "-r", LOCKFILE], check=True)
+
+    with open(os.path.join(side_dir, HASH_FILE), "w", encoding="utf-8") as f:
+        f.write(new_hash)
+
+    old_dir = f"{VENV_DIR}-old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(VENV_DIR):
+        os.rename(VENV_DIR, old_dir)
+    os.rename(side_dir, VENV_DIR)
+    shutil.rmtree(old_dir, ignore_errors=True)
 
-# Create virtual environment
-subprocess.run(["uv", "venv"], check=True)
 
-# Install packages in the virtual environment
-subprocess.run(["uv", "pip", "install", "."], check=True)
+start = time.perf_counter()
+CURRENT_HASH = requirements_hash()
+if venv_is_current(CURRENT_HASH):
+    BOOTSTRAP = "reused"
+else:
+    build_venv(CURRENT_HASH)
+    BOOTSTRAP = "rebuilt"
+print(f"Bootstrap: {BOOTSTRAP} {VENV_DIR} in {time.perf_counter() - start:.2f}s.")
 
-command_args = [r".venv\Scripts\python", "-m", "robot_framework"] + sys.argv[1:]
+# The robot runs from the source in this directory, so only the dependencies live in the environment.
+command_args = [venv_python(VENV_DIR), "-m", "robot_framework"] + sys.argv[1:]
 
 subprocess.run(command_args, check=True)
@@ -0,0 +1,92 @@
+"""This module contains the checkpoint journal, which records how far each element got, so a crashed run can resume.
+
+Each completed stage of an element is appended to a local JSON lines file and synced before the robot moves on:
+the receipt was fetched, the ticket was submitted in OPUS (with OPUS' confirmation text), the element was
+marked in Excel, its status was written to the database, and its terminal status was set in the queue.
+An element that comes back after a crash resumes after its last completed stage, so a ticket that OPUS
+confirmed is never created twice. Elements are dropped from the journal when the run starts, once their
+terminal queue status has been set and their database status, if any, has been written.
+"""
+import json
+import os
+import threading
+import time
+
+from robot_framework import config
+
+RECEIPT_FETCHED = "receipt_fetched"
+SUBMITTED = "submitted"
+EXCEL_MARKED = "excel_marked"
+DB_WRITTEN = "db_written"
+FINISHED = "finished"
+
+
+class CheckpointJournal:
+    """The completed stages of the elements in progress, shared by all workers and kept across runs."""
+
+    def __init__(self, path: str = config.CHECKPOINT_JOURNAL_PATH):
+        self.path = path
+        self._stages: dict[str, dict[str, dict]] | None = None
+        self._lock = threading.Lock()
+
+    def stages(self, uuid: str) -> dict[str, dict]:
+        """The completed stages of an element, each with the details recorded for it."""
+        with self._lock:
+            return dict(self._load().get(uuid, {}))
+
+    def record(self, uuid: str, stage: str, **details) -> None:
+        """Record that an element completed a stage. The entry is synced to disk before returning."""
+        with self._lock:
+            self._load().setdefault(uuid, {})[stage] = details
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'uuid': uuid, 'stage': stage, 'details': details, 'time': time.time()}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def recover(self) -> dict[str, bool]:
+        """Drop the elements that are finished in the queue and have their database status written, and find
+        the ones a crashed run marked in Excel without writing their database status.
+        An element whose database status was written before a crash kept it from finishing in the queue is kept,
+        so it resumes after the submit if the element comes back.
+
+        Returns:
+            Whether each such element failed, by uuid.
+        """
+        with self._lock:
+            self._stages = None
+            stages = {uuid: element for uuid, element in self._load().items() if not _done(element)}
+            self._stages = stages
+
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for uuid, element in stages.items():
+                    for stage, details in element.items():
+                        f.write(json.dumps({'uuid': uuid, 'stage': stage, 'details': details}) + '\n')
+            os.replace(temp_path, self.path)
+
+            return {uuid: element[EXCEL_MARKED].get('failed', False) for uuid, element in stages.items()
+                    if EXCEL_MARKED in element and DB_WRITTEN not in element}
+
+    def _load(self) -> dict[str, dict[str, dict]]:
+        """Read the journal once. A partially written last line from a crash is ignored."""
+        if self._stages is None:
+            self._stages = {}
+            lines = []
+            if os.path.exists(self.path):
+                with open(self.path, encoding='utf-8') as f:
+                    lines = f.read().splitlines()
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._stages.setdefault(entry['uuid'], {})[entry['stage']] = entry.get('details', {})
+        return self._stages
+
+
+def _done(element: dict[str, dict]) -> bool:
+    """Whether an element is finished in the queue and has no database status left to write."""
+    return FINISHED in element and (EXCEL_MARKED not in element or DB_WRITTEN in element)
+
+
+checkpoints = CheckpointJournal()
@@ -0,0 +1,143 @@
+"""This module contains circuit breakers for the systems the robot depends on, and the backoff used between retries.
+
+A breaker counts the outcomes of calls to its dependency within a sliding window.
+When enough calls fail it opens, and calls fail fast with CircuitOpenError until an exponentially
+growing, jittered delay has passed. Then it is half-open: one probe call is let through, which closes
+the breaker on success and opens it again on failure. Every state change starts a new generation, and
+a call only counts towards the generation it started in, so a call that outlives a state change is ignored.
+"""
+import random
+import threading
+import time
+from collections import deque
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+
+from robot_framework import config
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+    def __init__(self, name: str, retry_after: float, open_for: float):
+        super().__init__(f"The {name} circuit is open. Next probe in {retry_after:.0f} seconds.")
+        self.name = name
+        self.retry_after = retry_after
+        self.open_for = open_for
+
+
+def backoff_delay(attempt: int, base: float = config.RETRY_BASE_DELAY, cap: float = config.RETRY_MAX_DELAY) -> float:
+    """An exponential delay for the given attempt, starting at base and capped, with jitter of up to half the delay."""
+    delay = min(cap, base * 2 ** max(attempt - 1, 0))
+    return delay * random.uniform(0.5, 1)
+
+
+# pylint: disable-next = too-many-instance-attributes
+class CircuitBreaker:
+    """A circuit breaker for one dependency, shared by all workers."""
+
+    def __init__(self, name: str, window: float = config.BREAKER_WINDOW, min_calls: int = config.BREAKER_MIN_CALLS,
+                 failure_rate: float = config.BREAKER_FAILURE_RATE):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.state = CLOSED
+        self._calls: deque[tuple[float, bool]] = deque()
+        self._opens = 0
+        self._trips = 0
+        self._open_until = 0.0
+        self._open_since = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def call(self, func: callable, orchestrator_connection: OrchestratorConnection, is_failure: callable = lambda e: True):
+        """Call func through the breaker.
+
+        Args:
+            func: A function without arguments that calls the dependency.
+            orchestrator_connection: The connection to log state changes to.
+            is_failure: Decides if an exception raised by func says something about the dependency's health.
+
+        Returns:
+            The return value of func.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with its probe already running.
+        """
+        generation = self._before(orchestrator_connection)
+        try:
+            result = func()
+        except Exception as e:
+            self._after(generation, not is_failure(e), orchestrator_connection)
+            raise
+        self._after(generation, True, orchestrator_connection)
+        return result
+
+    def report(self, orchestrator_connection: OrchestratorConnection) -> None:
+        """Log how often the breaker opened during the run."""
+        if self._trips:
+            orchestrator_connection.log_info(f"The {self.name} circuit opened {self._trips} times and ended the run {self.state}.")
+
+    def _before(self, orchestrator_connection: OrchestratorConnection) -> int:
+        """Let a call through or raise CircuitOpenError. Returns the generation the call started in."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == CLOSED:
+                return self._generation
+            if self.state == OPEN and now >= self._open_until:
+                self._set_state(HALF_OPEN)
+                orchestrator_connection.log_info(f"The {self.name} circuit is half-open, probing with the next call.")
+                return self._generation
+            if self.state == HALF_OPEN:  # The probe is running, which may take as long as a whole call
+                raise CircuitOpenError(self.name, config.BREAKER_BASE_DELAY, now - self._open_since)
+            raise CircuitOpenError(self.name, max(self._open_until - now, 0), now - self._open_since)
+
+    def _after(self, generation: int, success: bool, orchestrator_connection: OrchestratorConnection) -> None:
+        with self._lock:
+            if generation != self._generation:  # A call that started before the state changed
+                return
+            now = time.monotonic()
+            if self.state == HALF_OPEN:  # Only the probe started in the half-open generation
+                if success:
+                    self._close(orchestrator_connection)
+                else:
+                    self._open(now, orchestrator_connection)
+                return
+
+            self._calls.append((now, success))
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._calls.popleft()
+
+            failures = sum(1 for _, ok in self._calls if not ok)
+            if len(self._calls) >= self.min_calls and failures / len(self._calls) >= self.failure_rate:
+                self._open(now, orchestrator_connection)
+
+    def _open(self, now: float, orchestrator_connection: OrchestratorConnection) -> None:
+        self._opens += 1
+        self._trips += 1
+        delay = backoff_delay(self._opens, config.BREAKER_BASE_DELAY, config.BREAKER_MAX_DELAY)
+        self._set_state(OPEN)
+        self._open_until = now + delay
+        if self._open_since is None:
+            self._open_since = now
+        self._calls.clear()
+        orchestrator_connection.log_info(f"The {self.name} circuit opened. Probing again in {delay:.0f} seconds.")
+
+    def _close(self, orchestrator_connection: OrchestratorConnection) -> None:
+        self._set_state(CLOSED)
+        self._opens = 0
+        self._open_since = None
+        orchestrator_connection.log_info(f"The {self.name} circuit closed after a successful probe.")
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        self._generation += 1
+
+
+opus = CircuitBreaker("OPUS")
+os2forms = CircuitBreaker("OS2Forms")
@@ -1,18 +1,36 @@
 """This module contains configuration constants used across the framework"""
 
-# The number of times the robot retries on an error before terminating.
+# The number of times an element is attempted before it is failed.
 MAX_RETRY_COUNT = 3
 
-# Whether the robot should be marked as failed if MAX_RETRY_COUNT is reached.
+# The number of errors a worker tolerates in one run before terminating.
+MAX_ERROR_COUNT = 10
+
+# Backoff between retries after a transient error: doubling from this many seconds up to a cap, with jitter.
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 60
+
+# Whether the robot should be marked as failed if MAX_ERROR_COUNT is reached.
 FAIL_ROBOT_ON_TOO_MANY_ERRORS = True
 
 # Error screenshot config
 SMTP_SERVER = "smtp.aarhuskommune.local"
 SMTP_PORT = 25
+SMTP_STARTTLS = True
 SCREENSHOT_SENDER = "robot@friend.dk"
+# Screenshots are scaled down to this width and saved as WebP (JPEG where Pillow lacks WebP) at this quality
+SCREENSHOT_MAX_WIDTH = 1280
+SCREENSHOT_QUALITY = 60
+# Identical errors within this many seconds are counted instead of mailed
+ERROR_REPORT_DEDUPE_WINDOW = 600
 
 # Constant/Credential names
 ERROR_EMAIL = "Error Email"
+DB_CONNECTION_STRING = "DbConnectionString"
+OS2_API_CREDENTIAL = "os2_api"
+OPUS_CREDENTIAL = "egenbefordring_udbetaling"
+# The query returning the journalizing database's current status per form as (form_id, status) rows, for reconciliation
+RECONCILE_STATUS_QUERY = "ReconcileStatusQuery"
 
 
 # Queue specific configs
@@ -24,4 +42,93 @@ QUEUE_NAME = "bur.egenbefordring.main"
 # The limit on how many queue elements to process
 MAX_TASK_COUNT = 100
 
+# The KMD portal OPUS is reached through
+OPUS_PORTAL_URL = "https://portal.kmd.dk/irj/portal"
+
+# Whether Chrome runs without a window. All input goes through WebDriver, so no desktop session is needed.
+BROWSER_HEADLESS = False
+
+# The OPUS browser's profile. "eager" hands the page over once the DOM is ready instead of waiting for images and fonts.
+# Each browser gets a persistent profile directory under BROWSER_PROFILE_DIR, so the portal's static assets stay cached
+# between runs; None uses a fresh incognito profile instead. Requests matching BROWSER_BLOCKED_URLS are blocked through
+# the DevTools protocol. With BROWSER_WARM_START the first browser is launched in the background while the robot initializes.
+BROWSER_PAGE_LOAD_STRATEGY = "eager"
+BROWSER_PROFILE_DIR = "chrome_profiles"
+BROWSER_BLOCKED_URLS = ("*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.ico", "*.woff", "*.woff2", "*.ttf", "*.mp4")
+BROWSER_WARM_START = True
+
+# The number of OPUS browser sessions processing the queue concurrently
+WORKER_COUNT = 1
+
+# Status ledger: flush Excel marks when this many are pending or this many seconds have passed
+LEDGER_FLUSH_EVERY = 10
+LEDGER_FLUSH_INTERVAL = 60
+
+# Status writer: flush terminal database statuses when this many are queued or this many seconds have passed,
+# and retry transient database errors this many times with a linear backoff in seconds
+STATUS_FLUSH_EVERY = 10
+STATUS_FLUSH_INTERVAL = 60
+STATUS_WRITE_RETRIES = 3
+STATUS_WRITE_BACKOFF = 2
+
+# Receipt prefetch: how many elements to download ahead and how long to wait for one download in seconds
+PREFETCH_DEPTH = 2
+PREFETCH_TIMEOUT = 120
+
+# Queue leases: elements are claimed up to LEASE_BATCH_SIZE at a time. A claimed element is leased for LEASE_DURATION
+# seconds from its start date, and the lease is renewed when the element is handed out more than halfway through it.
+# Elements whose lease expired are put back in the queue at start-up.
+LEASE_BATCH_SIZE = 10
+LEASE_DURATION = 3600
+
+# Receipt cache: receipts are kept in RECEIPT_CACHE_DIR until their element is done, so retries and restarts reuse them.
+# At start-up entries older than RECEIPT_CACHE_MAX_AGE seconds are evicted, then the oldest until the cache
+# is below RECEIPT_CACHE_MAX_BYTES. A download is abandoned after RECEIPT_DOWNLOAD_TIMEOUT seconds without data.
+RECEIPT_CACHE_DIR = "receipt_cache"
+RECEIPT_CACHE_MAX_AGE = 7 * 24 * 3600
+RECEIPT_CACHE_MAX_BYTES = 500 * 1024 * 1024
+RECEIPT_DOWNLOAD_TIMEOUT = 60
+
+# OPUS timing profile: timeout in seconds for each step, the polling interval and how long the portal
+# must stay idle before it counts as settled.
+OPUS_TIMING = {
+    "poll": 0.2,
+    "settle": 0.5,
+    "hent": 15,
+    "popup": 20,
+    "file_selected": 20,
+    "popup_closed": 20,
+    "grid": 10,
+    "kontroller": 20,
+    "opret": 30,
+    "reset": 15,
+}
+
+# Deadline in seconds for a single click, text entry or frame switch, and for creating one whole ticket
+STEP_TIMEOUT = 20
+TICKET_BUDGET = 300
+
+# How long to wait for a field from the selector registry to appear, in seconds
+SELECTOR_TIMEOUT = 30
+
+# The JSON lines file the run summary (p50/p95/max per stage and elements/hour) is appended to
+RUN_SUMMARY_PATH = "run_summaries.jsonl"
+
+# The JSON lines file the completed stages of each element are journaled to, so a crashed run resumes where it stopped
+CHECKPOINT_JOURNAL_PATH = "checkpoints.jsonl"
+
+# Circuit breakers for OPUS and OS2Forms: a breaker opens when at least BREAKER_MIN_CALLS calls within
+# BREAKER_WINDOW seconds failed at a rate of BREAKER_FAILURE_RATE or more. It stays open for a jittered delay
+# doubling from BREAKER_BASE_DELAY up to BREAKER_MAX_DELAY seconds, and the run stops once a breaker
+# has been open for BREAKER_GIVE_UP seconds.
+BREAKER_WINDOW = 300
+BREAKER_MIN_CALLS = 4
+BREAKER_FAILURE_RATE = 0.5
+BREAKER_BASE_DELAY = 30
+BREAKER_MAX_DELAY = 600
+BREAKER_GIVE_UP = 1800
+
+# Labels (lower case) of the OPUS toolbar action that opens a new, empty outlay form
+OPUS_NEW_DOCUMENT_LABELS = ("nyt bilag", "nyt udgiftsbilag", "ny")
+
 # ----------------------
@@ -0,0 +1,86 @@
+"""This module contains the decoded form of a queue element, parsed once when the element is dequeued."""
+import json
+import threading
+
+from OpenOrchestrator.database.queues import QueueElement
+
+# Fields that must be present and non-empty.
+REQUIRED_FIELDS = ('uuid', 'filename', 'attachment', 'cpr_encrypted', 'beloeb', 'psp', 'arts_konto')
+# Fields that must be present but may be empty.
+TEXT_FIELDS = ('posteringstekst', 'reference', 'naeste_agent', 'barnets_navn')
+
+_encryptor = None  # pylint: disable=invalid-name
+_encryptor_lock = threading.Lock()
+
+
+class InvalidElementError(ValueError):
+    """Raised when the data of a queue element is malformed or missing required fields."""
+
+
+class ElementRecord:
+    """A queue element with its JSON data decoded once.
+    Problems with the data are collected in `errors` and raised by `validate`.
+    The CPR number is decrypted on first access with an Encryptor shared by the run.
+    `attempts` counts how many times processing was started, and `status` is the terminal
+    queue status once one has been written, so it is only ever written once.
+    """
+
+    __slots__ = (
+        'queue_element', 'errors', 'uuid', 'filename', 'attachment', 'cpr_encrypted', 'beloeb', 'psp', 'arts_konto',
+        'posteringstekst', 'reference', 'naeste_agent', 'barnets_navn', 'attempts', 'status', '_cpr'
+    )
+
+    def __init__(self, queue_element: QueueElement):
+        self.queue_element = queue_element
+        self.errors = []
+        self.attempts = 0
+        self.status = None
+        self._cpr = None
+
+        try:
+            data = json.loads(queue_element.data)
+        except (TypeError, json.JSONDecodeError) as e:
+            self.errors.append(f"Element data is not valid JSON: {e}")
+            data = {}
+        if not isinstance(data, dict):
+            self.errors.append("Element data is not a JSON object.")
+            data = {}
+
+        for field in REQUIRED_FIELDS:
+            value = data.get(field)
+            if value is None or str(value).strip() == '':
+                self.errors.append(f"Missing '{field}'.")
+            setattr(self, field, None if value is None else str(value))
+
+        for field in TEXT_FIELDS:
+            if field not in data:
+                self.errors.append(f"Missing '{field}'.")
+            value = data.get(field)
+            setattr(self, field, '' if value is None else str(value))
+
+    @property
+    def id(self):
+        """The id of the queue element."""
+        return self.queue_element.id
+
+    @property
+    def cpr(self) -> str:
+        """The decrypted CPR number."""
+        if self._cpr is None:
+            self._cpr = get_encryptor().decrypt(self.cpr_encrypted.encode('utf-8'))
+        return self._cpr
+
+    def validate(self) -> None:
+        """Raise InvalidElementError if the element data had any problems."""
+        if self.errors:
+            raise InvalidElementError(f"Invalid queue element {self.id}: {' '.join(self.errors)}")
+
+
+def get_encryptor():
+    """Get the Encryptor shared by the run."""
+    global _encryptor
+    with _encryptor_lock:
+        if _encryptor is None:
+            from mbu_dev_shared_components.utils.fernet_encryptor import Encryptor
+            _encryptor = Encryptor()
+        return _encryptor
@@ -1,53 +1,213 @@
-"""This module has functionality to send error screenshots via smtp."""
+"""This module has functionality to send error screenshots via smtp.
 
+Reports are captured on the calling thread, so the screenshots show the moment of the error,
+and are encoded and sent by a background thread over one SMTP session reused for the run.
+"""
+
+import queue
 import smtplib
-from email.message import EmailMessage
-import base64
+import threading
+import time
 import traceback
+from email.message import EmailMessage
 from io import BytesIO
 
-from PIL import ImageGrab
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
 
 from robot_framework import config
 
+# The longest part of the error message used to recognise repeats of the same error.
+DEDUPE_KEY_LENGTH = 200
+
+
+# pylint: disable-next = too-many-instance-attributes
+class ErrorReporter:
+    """Sends error reports with a downscaled desktop screenshot and, if a browser is given,
+    the browser's own screenshot and DOM.
+    Reports of an error identical to one sent within the dedupe window are counted, and the count
+    is included in the next report of that error.
+    """
+
+    def __init__(self, smtp_server: str = config.SMTP_SERVER, smtp_port: int = config.SMTP_PORT,
+                 sender: str = config.SCREENSHOT_SENDER, starttls: bool = config.SMTP_STARTTLS,
+                 dedupe_window: float = config.ERROR_REPORT_DEDUPE_WINDOW):
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.sender = sender
+        self.starttls = starttls
+        self.dedupe_window = dedupe_window
+        self._sent: dict[tuple[str, str], tuple[float, int]] = {}
+        self._outbox: queue.Queue = queue.Queue()
+        self._smtp = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def report(self, to_address: str | list[str], exception: Exception, process_name: str, browser=None,
+               orchestrator_connection: OrchestratorConnection | None = None) -> bool:
+        """Capture an error report and queue it for sending.
+
+        Args:
+            to_address: Email address or list of addresses to send the error report.
+            exception: The exception that triggered the error.
+            process_name: Name of the process from OpenOrchestrator.
+            browser: The Selenium browser in use when the error happened, if any.
+            orchestrator_connection: The connection to log a failed sending to, if any.
+
+        Returns:
+            True if the report was queued, False if it was counted as a repeat.
+        """
+        key = (type(exception).__name__, str(exception)[:DEDUPE_KEY_LENGTH])
+        now = time.monotonic()
+        with self._lock:
+            last_sent, suppressed = self._sent.get(key, (None, 0))
+            if last_sent is not None and now - last_sent < self.dedupe_window:
+                self._sent[key] = (last_sent, suppressed + 1)
+                return False
+            self._sent[key] = (now, 0)
+            self._start()
+
+        self._outbox.put({
+            "to": to_address,
+            "process_name": process_name,
+            "exception": exception,
+            "trace": "".join(traceback.format_exception(exception)),
+            "suppressed": suppressed,
+            "desktop": _grab_desktop(),
+            "browser_png": _browser_capture(browser, lambda b: b.get_screenshot_as_png()),
+            "dom": _browser_capture(browser, lambda b: b.page_source),
+            "orchestrator_connection": orchestrator_connection,
+        })
+        return True
+
+    def close(self, timeout: float = 60) -> None:
+        """Send the queued reports and close the SMTP session."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._outbox.put(None)
+            thread.join(timeout)
+
+    def _start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="error_reporter", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while (report := self._outbox.get()) is not None:
+            try:
+                self._send(_build_message(report, self.sender))
+            # A failed error report must never take the robot down with it.
+            # pylint: disable-next = broad-exception-caught
+            except Exception as e:
+                if report["orchestrator_connection"] is not None:
+                    report["orchestrator_connection"].log_error(f"Sending error report failed: {e!r}")
+        self._disconnect()
+
+    def _send(self, msg: EmailMessage) -> None:
+        """Send over the open session, reconnecting once if the server has dropped it."""
+        try:
+            self._connect().send_message(msg)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self._disconnect()
+            self._connect().send_message(msg)
+
+    def _connect(self) -> smtplib.SMTP:
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.smtp_server, self.smtp_port)
+            if self.starttls:
+                smtp.starttls()
+            self._smtp = smtp
+        return self._smtp
+
+    def _disconnect(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
 
-def send_error_screenshot(to_address: str | list[str], exception: Exception, process_name: str):
+reporter = ErrorReporter()
+
+
+def send_error_screenshot(to_address: str | list[str], exception: Exception, process_name: str, browser=None,
+                          orchestrator_connection: OrchestratorConnection | None = None):
     """Sends an email with an error report, including a screenshot, when an exception occurs.
     Configuration details such as SMTP server, port, sender email, etc., should be set in 'config' module.
+    The email is sent in the background by the module's reporter. Call reporter.close() before exiting.
 
     Args:
         to_address: Email address or list of addresses to send the error report.
         exception: The exception that triggered the error.
         process_name: Name of the process from OpenOrchestrator.
+        browser: The Selenium browser in use when the error happened, if any.
+        orchestrator_connection: The connection to log a failed sending to, if any.
     """
-    # Create message
-    msg = EmailMessage()
-    msg['to'] = to_address
-    msg['from'] = config.SCREENSHOT_SENDER
-    msg['subject'] = f"Error screenshot: {process_name}"
+    reporter.report(to_address, exception, process_name, browser, orchestrator_connection)
 
-    # Take screenshot and convert to base64
-    screenshot = ImageGrab.grab()
-    buffer = BytesIO()
-    screenshot.save(buffer, format='PNG')
-    screenshot_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-
-    # Create an HTML message with the exception and screenshot
-    html_message = f"""
-    <html>
-        <body>
-            <p>Error type: {type(exception).__name__}</p>
-            <p>Error message: {exception}</p>
-            <p>{traceback.format_exc()}</p>
-            <img src="data:image/png;base64,{screenshot_base64}" alt="Screenshot">
-        </body>
-    </html>
+
+def _grab_desktop():
+    """Grab the desktop, or None where there is no display to grab."""
+    # PIL is only loaded when an error is reported.
+    from PIL import ImageGrab
+    try:
+        return ImageGrab.grab()
+    except OSError:
+        return None
+
+
+def _browser_capture(browser, capture: callable):
+    """Capture something from the browser, or None if there is no browser or it doesn't respond."""
+    if browser is None:
+        return None
+    from selenium.common.exceptions import WebDriverException
+    try:
+        return capture(browser)
+    except WebDriverException:
+        return None
+
+
+def _encode_image(image) -> tuple[bytes, str]:
+    """Scale an image down to config.SCREENSHOT_MAX_WIDTH and encode it lossy.
+
+    Returns:
+        The encoded image and its subtype.
     """
+    from PIL import Image, features
+    if image.width > config.SCREENSHOT_MAX_WIDTH:
+        height = round(image.height * config.SCREENSHOT_MAX_WIDTH / image.width)
+        image = image.resize((config.SCREENSHOT_MAX_WIDTH, height), Image.Resampling.LANCZOS)
+
+    image_format = "WEBP" if features.check("webp") else "JPEG"
+    buffer = BytesIO()
+    image.convert("RGB").save(buffer, format=image_format, quality=config.SCREENSHOT_QUALITY)
+    return buffer.getvalue(), image_format.lower()
+
+
+def _build_message(report: dict, sender: str) -> EmailMessage:
+    """Build the email of a captured report, with the screenshots and the DOM as attachments."""
+    from PIL import Image
+
+    exception = report["exception"]
+    msg = EmailMessage()
+    msg['to'] = report["to"]
+    msg['from'] = sender
+    msg['subject'] = f"Error screenshot: {report['process_name']}"
+
+    body = f"Error type: {type(exception).__name__}\nError message: {exception}\n"
+    if report["suppressed"]:
+        body += f"The same error occurred {report['suppressed']} more times since the last report.\n"
+    msg.set_content(f"{body}\n{report['trace']}")
 
-    msg.set_content("Please enable HTML to view this message.")
-    msg.add_alternative(html_message, subtype='html')
+    if report["desktop"] is not None:
+        data, subtype = _encode_image(report["desktop"])
+        msg.add_attachment(data, maintype="image", subtype=subtype, filename=f"desktop.{subtype}")
+    if report["browser_png"] is not None:
+        data, subtype = _encode_image(Image.open(BytesIO(report["browser_png"])))
+        msg.add_attachment(data, maintype="image", subtype=subtype, filename=f"browser.{subtype}")
+    if report["dom"] is not None:
+        msg.add_attachment(report["dom"], subtype="html", filename="dom.html")
 
-    # Send message
-    with smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT) as smtp:
-        smtp.starttls()
-        smtp.send_message(msg)
+    return msg
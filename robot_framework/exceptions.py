@@ -1,11 +1,16 @@
 """This module contains various functions and classes to handle errors in the framework."""
 
 import traceback
-import json
 
-from OpenOrchestrator.database.queues import QueueElement, QueueStatus
+from OpenOrchestrator.database.queues import QueueStatus
 from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
 from robot_framework.process import handle_post_process, get_status_params
+from robot_framework.status_ledger import StatusLedger
+from robot_framework.run_cache import RunCache, AuthenticationError
+from robot_framework.status_writer import StatusWriter
+from robot_framework.element_record import ElementRecord, InvalidElementError
+from robot_framework.circuit_breaker import CircuitOpenError
+from robot_framework.checkpoint import checkpoints, FINISHED
 from robot_framework import config
 from robot_framework import error_screenshot
 
@@ -16,35 +21,128 @@ class BusinessError(Exception):
 
 MAX_ERROR_MESSAGE_LENGTH = 1000  # Replace with the actual maximum length of your SQL column
 
+# Error classes. A business error fails the element and the worker moves on. A transient error is retried
+# on the same element. A fatal error releases the element and stops the run, as retrying can't fix it.
+BUSINESS = "business"
+TRANSIENT = "transient"
+FATAL = "fatal"
 
-def handle_error(message: str, error: Exception, queue_element: QueueElement | None, orchestrator_connection: OrchestratorConnection) -> None:
-    """Handles an error caught during the process.
+# Errors raised by bad configuration, rejected credentials or bugs.
+FATAL_ERRORS = (AuthenticationError, ImportError, NameError, AttributeError, TypeError, KeyError, PermissionError)
+
+# HTTP statuses that are worth retrying. Other 4xx answers are about the element itself.
+RETRYABLE_HTTP_STATUSES = (408, 429)
+
+
+def classify(error: Exception) -> str:
+    """Classify an error as BUSINESS, TRANSIENT or FATAL.
+    Wrapped errors are classified by the first cause that settles it, and anything unrecognised is TRANSIENT.
+    """
+    while error is not None:
+        if isinstance(error, (BusinessError, InvalidElementError)):
+            return BUSINESS
+        if isinstance(error, FATAL_ERRORS):
+            return FATAL
+        # An open circuit only reaches the retry loop once it has been open for config.BREAKER_GIVE_UP
+        if isinstance(error, CircuitOpenError):
+            return FATAL
+
+        response = getattr(error, "response", None)
+        status_code = getattr(response, "status_code", None)
+        if isinstance(status_code, int) and 400 <= status_code < 500 and status_code not in RETRYABLE_HTTP_STATUSES:
+            return BUSINESS
+
+        error = error.__cause__
+    return TRANSIENT
+
+
+def handle_error(message: str, error: Exception, record: ElementRecord | None, orchestrator_connection: OrchestratorConnection, ledger: StatusLedger, run_cache: RunCache, status_writer: StatusWriter) -> None:
+    """Handles an error that ends the processing of an element.
     Logs an error to OpenOrchestrator.
-    Marks the queue element (if any) as failed.
+    Marks the queue element (if any) as failed, in the queue, the Excel file and the database,
+    unless the element already has a terminal status.
     Sends an error screenshot by email.
 
     Args:
         message: A message to prepend to the error message.
         error: The exception that should be handled.
-        queue_element: The queue element to fail, if any.
+        record: The queue element to fail, if any.
         orchestrator_connection: A connection to OpenOrchestrator.
+        ledger: The status ledger to mark the element as failed in.
+        run_cache: The run cache holding the process arguments.
+        status_writer: The status writer to queue the failed status in.
     """
-    error_msg = f"{message}: {repr(error)}\n\nTrace:\n{traceback.format_exc()}"
-
-    if len(error_msg) > MAX_ERROR_MESSAGE_LENGTH:
-        error_msg = error_msg[:MAX_ERROR_MESSAGE_LENGTH - 20] + '... (truncated)'
+    error_msg = _error_message(message, error)
 
     # error_email = orchestrator_connection.get_constant(config.ERROR_EMAIL).value
     orchestrator_connection.log_error(error_msg)
+    # error_screenshot.send_error_screenshot(error_email, error, orchestrator_connection.process_name, orchestrator_connection=orchestrator_connection)
+
+    if record is None or record.status is not None:
+        return
+
+    record.status = QueueStatus.FAILED
+    orchestrator_connection.set_queue_element_status(record.id, QueueStatus.FAILED, error_msg)
+    if record.uuid:
+        checkpoints.record(record.uuid, FINISHED, status=QueueStatus.FAILED.name)
+
+    # An element too malformed to name its row can't be marked in Excel or the database
+    if record.uuid and record.filename:
+        try:
+            _, _, status_params_failed, _ = get_status_params(record.uuid)
+            handle_post_process(True, record, orchestrator_connection, status_params_failed, ledger, run_cache, status_writer)
+        # The element is already failed in the queue, so a broken post process is only logged.
+        # pylint: disable-next = broad-exception-caught
+        except Exception as e:
+            orchestrator_connection.log_error(f"Marking queue element {record.id} as failed in Excel and the database failed: {e!r}")
+
+
+def handle_transient_error(message: str, error: Exception, record: ElementRecord | None, orchestrator_connection: OrchestratorConnection) -> None:
+    """Handles an error the element will be retried after.
+    Only logs the error. The element stays in progress, and Excel and the database are left alone.
+
+    Args:
+        message: A message to prepend to the error message.
+        error: The exception that should be handled.
+        record: The queue element that will be retried, if any.
+        orchestrator_connection: A connection to OpenOrchestrator.
+    """
+    orchestrator_connection.log_error(_error_message(message, error))
+    if record is not None:
+        orchestrator_connection.log_info(f"Retrying queue element ID: {record.id}")
+
+
+def handle_fatal_error(message: str, error: Exception, record: ElementRecord | None, orchestrator_connection: OrchestratorConnection) -> None:
+    """Handles an error that stops the run.
+    Logs the error and puts the element (if any) back in the queue, so a later run can process it,
+    unless the element already has a terminal status.
+
+    Args:
+        message: A message to prepend to the error message.
+        error: The exception that should be handled.
+        record: The queue element to release, if any.
+        orchestrator_connection: A connection to OpenOrchestrator.
+    """
+    error_msg = _error_message(message, error)
+    orchestrator_connection.log_error(error_msg)
+    release_element(record, orchestrator_connection, error_msg)
+
 
-    if queue_element:
-        orchestrator_connection.set_queue_element_status(queue_element.id, QueueStatus.FAILED, error_msg)
+def release_element(record: ElementRecord | None, orchestrator_connection: OrchestratorConnection, message: str) -> None:
+    """Put an element (if any) back in the queue as new, unless it already has a terminal status."""
+    if record is None or record.status is not None:
+        return
+    record.status = QueueStatus.NEW
+    orchestrator_connection.set_queue_element_status(record.id, QueueStatus.NEW, message[:MAX_ERROR_MESSAGE_LENGTH])
+    orchestrator_connection.log_info(f"Released queue element ID: {record.id}")
 
-    # error_screenshot.send_error_screenshot(error_email, error, orchestrator_connection.process_name)
-    element_data = json.loads(queue_element.data)
-    form_id = element_data['uuid']
-    _, _, status_params_failed = get_status_params(form_id)
-    handle_post_process(True, queue_element, orchestrator_connection, status_params_failed)
+
+def _error_message(message: str, error: Exception) -> str:
+    error_msg = f"{message}: {repr(error)}\n\nTrace:\n{''.join(traceback.format_exception(error))}"
+
+    if len(error_msg) > MAX_ERROR_MESSAGE_LENGTH:
+        error_msg = error_msg[:MAX_ERROR_MESSAGE_LENGTH - 20] + '... (truncated)'
+    return error_msg
 
 
 def log_exception(orchestrator_connection: OrchestratorConnection) -> callable:
@@ -1,8 +1,41 @@
 """This module defines any initial processes to run when the robot starts."""
 
 from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+from OpenOrchestrator.database.queues import QueueStatus
 
+from robot_framework import config
+from robot_framework.receipt_cache import receipts
+from robot_framework.run_cache import RunCache
 
-def initialize(orchestrator_connection: OrchestratorConnection) -> None:
-    """Do all custom startup initializations of the robot."""
+
+def initialize(orchestrator_connection: OrchestratorConnection) -> RunCache:
+    """Do all custom startup initializations of the robot.
+
+    Returns:
+        The run cache with process arguments, constants and credentials resolved.
+        The OPUS credential is resolved when the browser first logs in, so idle runs never read it.
+        Old receipts are evicted from the receipt cache.
+        If there is work, the first OPUS browser is launched in the background.
+    """
     orchestrator_connection.log_trace("Initializing.")
+    run_cache = RunCache(orchestrator_connection)
+    run_cache.preload(
+        constants=(config.DB_CONNECTION_STRING,),
+        credentials=(config.OS2_API_CREDENTIAL,)
+    )
+    receipts.evict(orchestrator_connection)
+    warm_start_browser(orchestrator_connection)
+    return run_cache
+
+
+def warm_start_browser(orchestrator_connection: OrchestratorConnection) -> None:
+    """Launch the first OPUS browser in the background while the run starts, if config.BROWSER_WARM_START is set
+    and there are new queue elements. Idle runs never launch a browser.
+    """
+    if not config.BROWSER_WARM_START:
+        return
+    if not orchestrator_connection.get_queue_elements(config.QUEUE_NAME, status=QueueStatus.NEW, limit=1):
+        return
+
+    from robot_framework.subprocesses.browser_pool import pool
+    pool.warm_start(orchestrator_connection)
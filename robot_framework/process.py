@@ -1,105 +1,90 @@
 """This is the main process file for the robot framework."""
-import json
 import os
 import glob
-import pandas as pd
 from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
-from OpenOrchestrator.database.queues import QueueStatus
-from mbu_dev_shared_components.utils.db_stored_procedure_executor import execute_stored_procedure
 
-from robot_framework.subprocesses.get_os2form_receipt import fetch_receipt
+from robot_framework import circuit_breaker
+from robot_framework.checkpoint import checkpoints, RECEIPT_FETCHED, SUBMITTED, EXCEL_MARKED
+from robot_framework.timing import timed
+from robot_framework.element_record import ElementRecord
+from robot_framework.receipt_cache import receipts
+from robot_framework.run_cache import RunCache
+from robot_framework.status_writer import StatusWriter
 
 
-DIR_PATH = None
-
-
-def process(orchestrator_connection: OrchestratorConnection, queue_element, browser) -> None:
+def process(orchestrator_connection: OrchestratorConnection, record: ElementRecord, session, ledger, run_cache: RunCache, prefetcher, status_writer: StatusWriter) -> None:
     """Main process function."""
     orchestrator_connection.log_trace("Starting the process.")
-    process_args = json.loads(orchestrator_connection.process_arguments)
-    path_arg = process_args.get('path')
-
-    global DIR_PATH
-    DIR_PATH = path_arg
-
-    os2_api_key = orchestrator_connection.get_credential("os2_api").password
-    process_single_queue_element(queue_element, os2_api_key, path_arg, browser, orchestrator_connection)
+    process_single_queue_element(record, session, orchestrator_connection, ledger, run_cache, prefetcher, status_writer)
 
     orchestrator_connection.log_trace("Process completed.")
 
 
-def process_single_queue_element(queue_element, os2_api_key, path_arg, browser, orchestrator_connection: OrchestratorConnection):
+@timed("process_single_queue_element")
+def process_single_queue_element(record: ElementRecord, session, orchestrator_connection: OrchestratorConnection, ledger, run_cache: RunCache, prefetcher, status_writer: StatusWriter):
     """Process a single queue element."""
     from robot_framework.subprocesses.outlay_ticket_creation import handle_opus
-    connection_string = orchestrator_connection.get_constant("DbConnectionString").value
-    element_data = json.loads(queue_element.data)
-    form_id = element_data['uuid']
-    status_params_inprogress, status_params_success, _, _ = get_status_params(form_id)
-    orchestrator_connection.set_queue_element_status(queue_element.id, QueueStatus.IN_PROGRESS)
-    orchestrator_connection.log_trace(f"Processing queue element ID: {queue_element.id}")
-    execute_stored_procedure(
-        connection_string,
-        "journalizing.sp_update_status",
-        status_params_inprogress
-    )
-    folder_path = fetch_receipt(queue_element, os2_api_key, path_arg, orchestrator_connection)
-    handle_opus(queue_element, folder_path, browser, orchestrator_connection)
-    remove_attachment_if_exists(folder_path, element_data, orchestrator_connection)
-    handle_post_process(False, queue_element, orchestrator_connection, status_params_success)
-
-
-def remove_attachment_if_exists(folder_path, element_data, orchestrator_connection):
-    """Remove the attachment file if it exists."""
-    attachment_path = os.path.join(folder_path, f'receipt_{element_data["uuid"]}.pdf')
-    if os.path.exists(attachment_path):
-        orchestrator_connection.log_trace(f"Removing attachment file: {attachment_path}")
-        os.remove(attachment_path)
-
-
-def handle_post_process(failed, queue_element, orchestrator_connection: OrchestratorConnection, db_status):
-    """Update the Excel file with the status of the element."""
-    element_data = json.loads(queue_element.data)
-    uuid = element_data['uuid']
-    excel_filename = element_data['filename']
-    connection_string = orchestrator_connection.get_constant("DbConnectionString").value
-
-    excel_files = glob.glob(os.path.join(DIR_PATH, excel_filename))
-    if not excel_files:
-        raise FileNotFoundError(f"{excel_filename} not found in {DIR_PATH}.")
-
-    file_to_read = excel_files[0]
-    df = pd.read_excel(file_to_read, engine='openpyxl')
-    df = ensure_columns(df)
-    update_dataframe(df, uuid, failed)
-
-    with pd.ExcelWriter(file_to_read, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False)
-
-    execute_stored_procedure(
-        connection_string,
-        "journalizing.sp_update_status",
-        db_status
-    )
-    orchestrator_connection.log_trace(f"Element status updated to {'failed' if failed else 'succeeded'} in Excel file")
-
-
-def ensure_columns(df):
-    """Ensure that the Excel file has the necessary columns."""
-    for col in ['behandlet_fejl', 'behandlet_ok']:
-        if col not in df.columns:
-            df[col] = ''
-    df['behandlet_fejl'] = df['behandlet_fejl'].astype(str)
-    df['behandlet_ok'] = df['behandlet_ok'].astype(str)
-    return df
-
-
-def update_dataframe(df, uuid, failed):
-    """Update the dataframe with the status of the element."""
-    df.loc[df['uuid'] == uuid, 'behandlet_fejl' if failed else 'behandlet_ok'] = 'x'
-    if not failed:
-        df.loc[df['uuid'] == uuid, 'behandlet_fejl'] = ' '
+    from robot_framework.exceptions import classify, TRANSIENT, BusinessError
+    record.validate()
+    record.attempts += 1
+    status_params_inprogress, status_params_success, _, _ = get_status_params(record.uuid)
+    orchestrator_connection.log_trace(f"Processing queue element ID: {record.id}, attempt {record.attempts}")
+    if record.attempts == 1:  # The element is already in progress in the queue since it was leased
+        status_writer.write(status_params_inprogress)
+    submitted = checkpoints.stages(record.uuid).get(SUBMITTED)
+    if submitted is not None:  # OPUS confirmed the ticket before a crash or an error in the post process
+        orchestrator_connection.log_info(f"Queue element ID: {record.id} was already submitted ('{submitted.get('confirmation')}'), resuming after the submit.")
+        prefetcher.discard(record)
     else:
-        df.loc[df['uuid'] == uuid, 'behandlet_ok'] = ' '
+        # The row is checked before OPUS, as a ticket for an element that can't be marked would be retried
+        workbook_path = find_workbook(record, run_cache)
+        if not ledger.contains(workbook_path, record.uuid):
+            prefetcher.discard(record)
+            raise BusinessError(f"uuid {record.uuid} not found in {workbook_path}.")
+        attachment_path = prefetcher.receipt(record)
+        checkpoints.record(record.uuid, RECEIPT_FETCHED)
+        confirmation = circuit_breaker.opus.call(
+            lambda: handle_opus(record, attachment_path, session, orchestrator_connection),
+            orchestrator_connection,
+            lambda e: classify(e) == TRANSIENT
+        )
+        checkpoints.record(record.uuid, SUBMITTED, confirmation=confirmation)
+    receipts.discard(record.uuid, orchestrator_connection)
+    handle_post_process(False, record, orchestrator_connection, status_params_success, ledger, run_cache, status_writer)
+
+
+@timed("handle_post_process")
+def handle_post_process(failed, record: ElementRecord, orchestrator_connection: OrchestratorConnection, db_status, ledger, run_cache: RunCache, status_writer: StatusWriter):
+    """Mark the element in the Excel file's status ledger and queue its status for the database.
+    An element already marked in Excel by an earlier attempt is not marked again, and an element without
+    a row in its workbook is only logged. The database status is queued even if marking in Excel fails.
+    """
+    uuid = record.uuid
+
+    try:
+        if EXCEL_MARKED not in checkpoints.stages(uuid):
+            workbook_path = find_workbook(record, run_cache)
+            if ledger.contains(workbook_path, uuid):
+                ledger.mark(workbook_path, uuid, failed)
+                checkpoints.record(uuid, EXCEL_MARKED, failed=failed)
+            else:
+                orchestrator_connection.log_error(f"uuid {uuid} not found in {workbook_path}, so it is not marked in Excel.")
+    finally:
+        status_writer.queue(db_status)
+    orchestrator_connection.log_trace(f"Element status updated to {'failed' if failed else 'succeeded'} in Excel status ledger")
+
+
+def find_workbook(record: ElementRecord, run_cache: RunCache) -> str:
+    """Find the path of the Excel file an element belongs to.
+
+    Raises:
+        FileNotFoundError: If the file is not in the folder of the process arguments.
+    """
+    dir_path = run_cache.process_args.get('path')
+    excel_files = glob.glob(os.path.join(dir_path, record.filename))
+    if not excel_files:
+        raise FileNotFoundError(f"{record.filename} not found in {dir_path}.")
+    return excel_files[0]
 
 
 def get_status_params(form_id: str):
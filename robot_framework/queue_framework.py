@@ -4,16 +4,60 @@
 # pylint: disable=duplicate-code
 
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
 from OpenOrchestrator.database.queues import QueueStatus
 
 from robot_framework import initialize
 from robot_framework import reset
-from robot_framework.exceptions import handle_error, BusinessError, log_exception
+from robot_framework.exceptions import (
+    handle_error, handle_transient_error, handle_fatal_error, release_element, classify, log_exception, BUSINESS, FATAL
+)
+from robot_framework import circuit_breaker
+from robot_framework.circuit_breaker import CircuitOpenError, backoff_delay
 from robot_framework import process
 from robot_framework import config
-from robot_framework.subprocesses.outlay_ticket_creation import initialize_browser
+from robot_framework import error_screenshot
+from robot_framework.checkpoint import checkpoints, FINISHED
+from robot_framework.timing import timings
+from robot_framework.run_cache import RunCache
+from robot_framework.status_ledger import StatusLedger
+from robot_framework.status_writer import StatusWriter
+from robot_framework.receipt_prefetcher import ReceiptPrefetcher
+from robot_framework.queue_leases import QueueLeases
+
+# Selenium and the OPUS modules are imported when the first browser is opened or warm-started, not at start-up.
+OPUS_SELECTORS_MODULE = "robot_framework.subprocesses.opus_selectors"
+OPUS_INTERACTION_MODULE = "robot_framework.subprocesses.opus_interaction"
+BROWSER_POOL_MODULE = "robot_framework.subprocesses.browser_pool"
+
+
+class TaskBudget:
+    """The number of queue elements the run may still process, shared by all workers."""
+
+    def __init__(self, limit: int):
+        self._remaining = limit
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        """Take one task from the budget. Returns False if the budget is spent."""
+        with self._lock:
+            if self._remaining <= 0:
+                return False
+            self._remaining -= 1
+            return True
+
+    def refund(self) -> None:
+        """Give back a task that was taken but not processed."""
+        with self._lock:
+            self._remaining += 1
+
+    @property
+    def remaining(self) -> int:
+        """The number of tasks left."""
+        return self._remaining
 
 
 def main():
@@ -22,46 +66,91 @@ def main():
     sys.excepthook = log_exception(orchestrator_connection)
 
     orchestrator_connection.log_trace("Robot Framework started.")
-    initialize.initialize(orchestrator_connection)
-    opus_username = orchestrator_connection.get_credential("egenbefordring_udbetaling").username
-    opus_password = orchestrator_connection.get_credential("egenbefordring_udbetaling").password
+    timings.start()
+    run_cache = initialize.initialize(orchestrator_connection)
+    ledger = StatusLedger(orchestrator_connection)
+    ledger.recover(run_cache.process_args['path'])
+    status_writer = StatusWriter(orchestrator_connection, run_cache)
+    recover_checkpoints(orchestrator_connection, status_writer)
+    leases = QueueLeases(orchestrator_connection)
+    leases.reclaim_expired()
+    budget = TaskBudget(config.MAX_TASK_COUNT)
+    stop = threading.Event()
+
+    if config.WORKER_COUNT == 1:
+        error_counts = [run_worker(orchestrator_connection, run_cache, ledger, status_writer, leases, budget, stop)]
+    else:
+        with ThreadPoolExecutor(max_workers=config.WORKER_COUNT, thread_name_prefix="opus_worker") as pool:
+            workers = [pool.submit(run_worker, orchestrator_connection, run_cache, ledger, status_writer, leases, budget, stop)
+                       for _ in range(config.WORKER_COUNT)]
+            try:
+                wait(workers)
+            except KeyboardInterrupt:
+                orchestrator_connection.log_info("Stopping workers after their current element.")
+                stop.set()
+                wait(workers)
+            error_counts = [worker.result() for worker in workers]
+    leases.close()
+    if BROWSER_POOL_MODULE in sys.modules:
+        sys.modules[BROWSER_POOL_MODULE].pool.close(orchestrator_connection)
+
+    if OPUS_SELECTORS_MODULE in sys.modules:
+        sys.modules[OPUS_SELECTORS_MODULE].registry.report(orchestrator_connection)
+    if OPUS_INTERACTION_MODULE in sys.modules:
+        sys.modules[OPUS_INTERACTION_MODULE].histograms.report(orchestrator_connection)
+    circuit_breaker.opus.report(orchestrator_connection)
+    circuit_breaker.os2forms.report(orchestrator_connection)
+    timings.report(orchestrator_connection, config.RUN_SUMMARY_PATH)
+    try:
+        ledger.close()
+    finally:  # Marks that could not be flushed stay journaled for the next run, the rest must still shut down
+        status_writer.close()
+        error_screenshot.reporter.close()
+        reset.clean_up(orchestrator_connection)
+        reset.close_all(orchestrator_connection)
+        reset.kill_all(orchestrator_connection)
+
+    if config.FAIL_ROBOT_ON_TOO_MANY_ERRORS and config.MAX_ERROR_COUNT in error_counts:
+        raise RuntimeError("Process failed too many times.")
+
+
+def run_worker(orchestrator_connection: OrchestratorConnection, run_cache: RunCache, ledger: StatusLedger,
+               status_writer: StatusWriter, leases: QueueLeases, budget: TaskBudget, stop: threading.Event) -> int:
+    """Process queue elements in one OPUS browser session until the queue is empty, the budget is spent or stop is set.
+    Each worker has its own browser, receipt prefetcher and error count. Each element is attempted up to
+    config.MAX_RETRY_COUNT times, with a backoff between attempts.
 
-    browser = None
+    Returns:
+        The number of errors the worker retried on.
+    """
+    prefetcher = ReceiptPrefetcher(orchestrator_connection, run_cache, leases)
+
+    session = None
     queue_element = None
     error_count = 0
-    task_count = 0
     # Retry loop
-    for _ in range(config.MAX_RETRY_COUNT):
+    for _ in range(config.MAX_ERROR_COUNT):
         try:
             reset.reset(orchestrator_connection)
 
-            # Only fetch a new queue element if none exists
-            if queue_element is None:
-                queue_element = orchestrator_connection.get_next_queue_element(config.QUEUE_NAME)
-
-            if browser is None:
-                browser = initialize_browser(opus_username, opus_password)
-
             # Queue loop
-            while task_count < config.MAX_TASK_COUNT:
+            while not stop.is_set():
 
                 if queue_element is None:  # Fetch the next element if the current is None
-                    queue_element = orchestrator_connection.get_next_queue_element(config.QUEUE_NAME)
+                    if not budget.take():
+                        break  # Break queue loop
+                    queue_element = prefetcher.next(budget.remaining + 1)
 
                 if not queue_element:
                     orchestrator_connection.log_info("Queue empty.")
                     break  # Break queue loop
 
-                task_count += 1  # Increment task count
-
-                try:
-                    process.process(orchestrator_connection, queue_element, browser)
-                    orchestrator_connection.set_queue_element_status(queue_element.id, QueueStatus.DONE, "Success")
-                    queue_element = None  # Reset the queue element on success
+                if session is None:  # The browser is only launched once there is work
+                    session = open_session(orchestrator_connection, run_cache)
 
-                except BusinessError as error:
-                    handle_error("Business Error", error, queue_element, orchestrator_connection)
-                    queue_element = None  # Move to the next queue element after handling BusinessError
+                if not process_element(queue_element, session, orchestrator_connection, ledger, run_cache, prefetcher, status_writer, stop):
+                    budget.refund()  # The element was put back in the queue
+                queue_element = None  # Move to the next queue element
 
             break  # Break retry loop
 
@@ -69,13 +158,93 @@ def main():
         # pylint: disable-next = broad-exception-caught
         except Exception as error:
             error_count += 1
-            handle_error(f"Process Error #{error_count}", error, queue_element, orchestrator_connection)
-            if browser is None:
-                browser = initialize_browser(opus_username, opus_password)
-
-    reset.clean_up(orchestrator_connection)
-    reset.close_all(orchestrator_connection)
-    reset.kill_all(orchestrator_connection)
-
-    if config.FAIL_ROBOT_ON_TOO_MANY_ERRORS and error_count == config.MAX_RETRY_COUNT:
-        raise RuntimeError("Process failed too many times.")
+            if handle_retry_error(error, error_count, queue_element, orchestrator_connection, ledger, run_cache, status_writer):
+                queue_element = None
+            if classify(error) == FATAL:
+                stop.set()
+                # A fatal error fails the robot like running out of retries does
+                error_count = config.MAX_ERROR_COUNT
+                break  # Break retry loop
+            if session is not None:
+                session.invalidate()
+            stop.wait(backoff_delay(error_count))
+
+    # An element still held after the last error is left for a later run
+    release_element(queue_element, orchestrator_connection, "Released when the worker stopped after too many errors.")
+    prefetcher.close()
+    if session is not None:
+        session.report()
+        session.close()
+
+    return error_count
+
+
+def process_element(record, session, orchestrator_connection: OrchestratorConnection, ledger: StatusLedger,
+                    run_cache: RunCache, prefetcher: ReceiptPrefetcher, status_writer: StatusWriter, stop: threading.Event) -> bool:
+    """Process one queue element and mark it as done, or as failed on a business error.
+    If a dependency's circuit is open, the element is put back in the queue and the worker waits until the
+    circuit is probed again. Any other error, and an open circuit past config.BREAKER_GIVE_UP, is raised to the retry loop.
+
+    Returns:
+        False if the element was put back in the queue, else True.
+    """
+    try:
+        process.process(orchestrator_connection, record, session, ledger, run_cache, prefetcher, status_writer)
+        record.status = QueueStatus.DONE
+        orchestrator_connection.set_queue_element_status(record.id, QueueStatus.DONE, "Success")
+        checkpoints.record(record.uuid, FINISHED, status=QueueStatus.DONE.name)
+
+    except CircuitOpenError as error:
+        if error.open_for >= config.BREAKER_GIVE_UP:
+            raise
+        release_element(record, orchestrator_connection, str(error))
+        orchestrator_connection.log_info(f"Waiting {error.retry_after:.0f} seconds for the {error.name} circuit.")
+        stop.wait(error.retry_after)
+        return False
+
+    # We actually want to catch all exceptions possible here, and classify them.
+    # pylint: disable-next = broad-exception-caught
+    except Exception as error:
+        if classify(error) != BUSINESS:
+            raise
+        handle_error("Business Error", error, record, orchestrator_connection, ledger, run_cache, status_writer)
+
+    return True
+
+
+def handle_retry_error(error: Exception, error_count: int, record, orchestrator_connection: OrchestratorConnection,
+                       ledger: StatusLedger, run_cache: RunCache, status_writer: StatusWriter) -> bool:
+    """Handle an error caught by the retry loop according to its class.
+    A transient error is only logged while the element has attempts left, so it is retried as is.
+
+    Returns:
+        Whether the element is finished with, i.e. failed or released, and must not be retried.
+    """
+    if classify(error) == FATAL:
+        handle_fatal_error("Fatal Error", error, record, orchestrator_connection)
+        return True
+
+    if record is None or record.attempts < config.MAX_RETRY_COUNT:
+        handle_transient_error(f"Process Error #{error_count}", error, record, orchestrator_connection)
+        return False
+
+    handle_error(f"Process Error #{error_count}", error, record, orchestrator_connection, ledger, run_cache, status_writer)
+    return True
+
+
+def recover_checkpoints(orchestrator_connection: OrchestratorConnection, status_writer: StatusWriter) -> None:
+    """Queue the database statuses of elements an earlier run marked in Excel but died before writing.
+    Elements that were further along are resumed from the checkpoint journal when they are processed.
+    """
+    unwritten = checkpoints.recover()
+    for uuid, failed in unwritten.items():
+        _, status_params_success, status_params_failed, _ = process.get_status_params(uuid)
+        status_writer.queue(status_params_failed if failed else status_params_success)
+    if unwritten:
+        orchestrator_connection.log_info(f"Recovered {len(unwritten)} database statuses from the checkpoint journal.")
+
+
+def open_session(orchestrator_connection: OrchestratorConnection, run_cache: RunCache):
+    """Create the OPUS session. The browser is launched when the first form is opened."""
+    from robot_framework.subprocesses.opus_session import OpusSession
+    return OpusSession(orchestrator_connection, run_cache)
@@ -0,0 +1,88 @@
+"""This module contains the queue leases, which claim queue elements in batches for all workers.
+
+A claimed element is in progress in OpenOrchestrator, and its start date is the start of its lease.
+Elements are claimed up to config.LEASE_BATCH_SIZE at a time into a local buffer the workers take from,
+and an element whose lease is more than half over is renewed before it is handed out.
+At start-up, elements whose lease expired because the robot holding them died are put back in the queue,
+and at shutdown the elements still in the buffer are released.
+"""
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+from OpenOrchestrator.database.queues import QueueElement, QueueStatus
+
+from robot_framework import config
+
+# The page size used when reading the elements in progress.
+PAGE_SIZE = 100
+
+
+class QueueLeases:
+    """Claimed queue elements waiting to be processed, shared by all workers."""
+
+    def __init__(self, orchestrator_connection: OrchestratorConnection, batch_size: int = config.LEASE_BATCH_SIZE,
+                 duration: float = config.LEASE_DURATION):
+        self.orchestrator_connection = orchestrator_connection
+        self.batch_size = batch_size
+        self.duration = timedelta(seconds=duration)
+        self._buffer: deque[QueueElement] = deque()
+        self._lock = threading.Lock()
+
+    def take(self, limit: int) -> QueueElement | None:
+        """Take the next claimed element, claiming a new batch if the buffer is empty.
+
+        Args:
+            limit: The number of elements the run may still process. No more than this is claimed.
+
+        Returns:
+            The next queue element, or None if the queue is empty.
+        """
+        with self._lock:
+            if not self._buffer:
+                self._claim(min(self.batch_size, limit))
+            if not self._buffer:
+                return None
+            queue_element = self._buffer.popleft()
+
+        if queue_element.start_date is None or datetime.now() - queue_element.start_date > self.duration / 2:
+            self.orchestrator_connection.set_queue_element_status(queue_element.id, QueueStatus.IN_PROGRESS)
+            queue_element.start_date = datetime.now()
+        return queue_element
+
+    def reclaim_expired(self) -> None:
+        """Put elements whose lease expired back in the queue."""
+        cutoff = datetime.now() - self.duration
+        expired = []
+        offset = 0
+        while True:
+            page = self.orchestrator_connection.get_queue_elements(
+                config.QUEUE_NAME, status=QueueStatus.IN_PROGRESS, offset=offset, limit=PAGE_SIZE
+            )
+            expired.extend(element for element in page if element.start_date is None or element.start_date < cutoff)
+            if len(page) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+
+        for element in expired:
+            self.orchestrator_connection.set_queue_element_status(element.id, QueueStatus.NEW, "Lease expired.")
+        if expired:
+            self.orchestrator_connection.log_info(f"Put {len(expired)} queue elements with an expired lease back in the queue.")
+
+    def close(self) -> None:
+        """Put the claimed elements that were never handed out back in the queue."""
+        with self._lock:
+            while self._buffer:
+                queue_element = self._buffer.popleft()
+                self.orchestrator_connection.set_queue_element_status(queue_element.id, QueueStatus.NEW, "Lease released at shutdown.")
+                self.orchestrator_connection.log_trace(f"Released leased queue element ID: {queue_element.id}")
+
+    def _claim(self, count: int) -> None:
+        for _ in range(count):
+            queue_element = self.orchestrator_connection.get_next_queue_element(config.QUEUE_NAME)
+            if queue_element is None:
+                break
+            self._buffer.append(queue_element)
+        if self._buffer:
+            self.orchestrator_connection.log_trace(f"Claimed {len(self._buffer)} queue elements.")
@@ -0,0 +1,160 @@
+"""This module contains the on-disk cache of OS2FORMS receipts.
+
+Receipts are keyed by form uuid and stored as `receipt_<uuid>.pdf` with a sidecar file holding their size
+and SHA-256. A download is streamed to a temporary file in the cache folder and renamed into place only
+when it is complete, so a crash never leaves a partial receipt behind. A cached receipt is only used if
+its size and hash still match the sidecar.
+"""
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+
+from robot_framework import config
+
+CHUNK_SIZE = 64 * 1024
+SIDECAR_SUFFIX = ".sha256.json"
+PARTIAL_SUFFIX = ".part"
+
+
+class ReceiptCache:
+    """Receipts downloaded from OS2FORMS, shared by all workers and kept across runs."""
+
+    def __init__(self, directory: str = config.RECEIPT_CACHE_DIR, max_age: float = config.RECEIPT_CACHE_MAX_AGE,
+                 max_bytes: int = config.RECEIPT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+
+    def path(self, uuid: str) -> str:
+        """The path a form's receipt is cached at."""
+        return os.path.join(self.directory, f"receipt_{uuid}.pdf")
+
+    def get(self, uuid: str) -> str | None:
+        """Get the path of a form's cached receipt, or None if it is not cached or fails validation.
+        A receipt that fails validation is removed.
+        """
+        path = self.path(uuid)
+        # Under the lock, so a download finishing between its rename and its sidecar is not taken for a broken receipt
+        with self._lock:
+            try:
+                with open(path + SIDECAR_SUFFIX, encoding="utf-8") as f:
+                    expected = json.load(f)
+                if os.path.getsize(path) == expected["size"] and _sha256(path) == expected["sha256"]:
+                    return path
+            except (OSError, ValueError, KeyError):
+                pass
+            self._remove(path)
+            return None
+
+    def download(self, uuid: str, url: str, api_key: str) -> str:
+        """Stream a form's receipt from OS2FORMS into the cache.
+
+        Returns:
+            The path of the cached receipt.
+
+        Raises:
+            requests.exceptions.RequestException: If the download fails.
+            RuntimeError: If the response is empty or shorter than its Content-Length.
+        """
+        import requests
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(uuid)
+        digest = hashlib.sha256()
+        size = 0
+        fd, partial_path = tempfile.mkstemp(dir=self.directory, prefix=f"receipt_{uuid}.", suffix=PARTIAL_SUFFIX)
+        try:
+            with os.fdopen(fd, "wb") as f, requests.get(url, headers={"api-key": api_key}, stream=True,
+                                                        timeout=config.RECEIPT_DOWNLOAD_TIMEOUT) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                expected_size = response.headers.get("Content-Length")
+                if "Content-Encoding" in response.headers:  # The length is of the encoded body
+                    expected_size = None
+
+            if size == 0 or (expected_size is not None and size != int(expected_size)):
+                raise RuntimeError(f"Incomplete receipt download from {url}: got {size} of {expected_size or 'unknown'} bytes.")
+
+            with self._lock:
+                os.replace(partial_path, path)
+                _write_atomic(path + SIDECAR_SUFFIX, json.dumps({"size": size, "sha256": digest.hexdigest()}))
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        return path
+
+    def discard(self, uuid: str, orchestrator_connection: OrchestratorConnection) -> None:
+        """Remove a form's receipt once its element is done."""
+        path = self.path(uuid)
+        if os.path.exists(path):
+            orchestrator_connection.log_trace(f"Removing attachment file: {path}")
+        self._remove(path)
+
+    def evict(self, orchestrator_connection: OrchestratorConnection) -> None:
+        """Remove leftover partial downloads, receipts older than max_age, and then the oldest receipts until
+        the cache is below max_bytes. Should only be called while no downloads are running.
+        """
+        if not os.path.isdir(self.directory):
+            return
+
+        for partial_path in glob.glob(os.path.join(self.directory, f"*{PARTIAL_SUFFIX}")):
+            os.remove(partial_path)
+
+        now = time.time()
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, "receipt_*.pdf")):
+            try:
+                entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+            except OSError:
+                continue
+        entries.sort()
+
+        evicted = 0
+        total = sum(size for _, size, _ in entries)
+        for modified, size, path in entries:
+            if now - modified <= self.max_age and total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            evicted += 1
+
+        if evicted:
+            orchestrator_connection.log_info(f"Evicted {evicted} receipts from the receipt cache, {len(entries) - evicted} remain.")
+
+    def _remove(self, path: str) -> None:
+        with self._lock:
+            for file_path in (path, path + SIDECAR_SUFFIX):
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+
+
+receipts = ReceiptCache()
+
+
+def _sha256(path: str) -> str:
+    """The SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: str, text: str) -> None:
+    """Write a small text file by writing a temporary file next to it and renaming it into place."""
+    fd, partial_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=PARTIAL_SUFFIX)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(partial_path, path)
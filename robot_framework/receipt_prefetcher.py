@@ -0,0 +1,104 @@
+"""This module contains a prefetcher that downloads OS2FORMS receipts ahead of the OPUS browser step."""
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+from OpenOrchestrator.database.queues import QueueStatus
+
+from robot_framework import config
+from robot_framework import circuit_breaker
+from robot_framework.circuit_breaker import CircuitOpenError
+from robot_framework.element_record import ElementRecord
+from robot_framework.exceptions import classify, TRANSIENT
+from robot_framework.queue_leases import QueueLeases
+from robot_framework.run_cache import RunCache, call_with_refresh
+from robot_framework.subprocesses.get_os2form_receipt import fetch_receipt
+
+
+# pylint: disable-next = too-many-instance-attributes
+class ReceiptPrefetcher:
+    """Takes up to `depth` leased queue elements ahead of the one being processed and downloads their receipts in the background.
+    Elements are only taken when the buffer has room, so at most `depth` downloads are ever in flight.
+    A failed or timed out download is raised from `receipt`, on the element's normal processing path.
+    """
+
+    def __init__(self, orchestrator_connection: OrchestratorConnection, run_cache: RunCache, leases: QueueLeases,
+                 depth: int = config.PREFETCH_DEPTH, timeout: float = config.PREFETCH_TIMEOUT):
+        self.orchestrator_connection = orchestrator_connection
+        self.run_cache = run_cache
+        self.leases = leases
+        self.depth = depth
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max(depth, 1), thread_name_prefix="receipt_prefetch")
+        self._buffer: deque[ElementRecord] = deque()
+        self._downloads: dict[str, Future] = {}
+
+    def next(self, budget: int) -> ElementRecord | None:
+        """Get the next queue element and top up the prefetch buffer.
+
+        Args:
+            budget: The number of elements the run may still process. No more than this is taken.
+
+        Returns:
+            The next decoded queue element, or None if the queue is empty.
+        """
+        while len(self._buffer) < min(self.depth + 1, budget):
+            queue_element = self.leases.take(budget - len(self._buffer))
+            if queue_element is None:
+                break
+            record = ElementRecord(queue_element)
+            self._buffer.append(record)
+            if not record.errors:
+                self._downloads[record.id] = self._executor.submit(self._fetch, record)
+
+        return self._buffer.popleft() if self._buffer else None
+
+    def receipt(self, record: ElementRecord) -> str:
+        """Get the path of the element's receipt, waiting for the prefetch if one is running.
+        Elements without a prefetch, e.g. when retrying after an error, are downloaded synchronously,
+        as are elements whose prefetch found the OS2Forms circuit open.
+
+        Returns:
+            The path of the receipt in the receipt cache.
+        """
+        download = self._downloads.pop(record.id, None)
+        if download is None:
+            return self._fetch(record)
+
+        try:
+            return download.result(timeout=self.timeout)
+        except CircuitOpenError:
+            return self._fetch(record)
+        except FutureTimeoutError as e:
+            download.cancel()
+            raise TimeoutError(f"Receipt download for queue element {record.id} timed out after {self.timeout} seconds.") from e
+
+    def discard(self, record: ElementRecord) -> None:
+        """Cancel the prefetch of an element whose receipt is not needed."""
+        download = self._downloads.pop(record.id, None)
+        if download is not None:
+            download.cancel()
+
+    def close(self) -> None:
+        """Stop prefetching and put taken but unprocessed elements back in the queue."""
+        for download in self._downloads.values():
+            download.cancel()
+        self._executor.shutdown(wait=True)
+        self._downloads.clear()
+
+        while self._buffer:
+            record = self._buffer.popleft()
+            self.orchestrator_connection.set_queue_element_status(record.id, QueueStatus.NEW, "Released by prefetcher at shutdown.")
+            self.orchestrator_connection.log_trace(f"Released prefetched queue element ID: {record.id}")
+
+    def _fetch(self, record: ElementRecord) -> str:
+        return circuit_breaker.os2forms.call(
+            lambda: call_with_refresh(
+                self.run_cache,
+                config.OS2_API_CREDENTIAL,
+                lambda: fetch_receipt(record, self.run_cache.get_credential(config.OS2_API_CREDENTIAL).password,
+                                      self.orchestrator_connection)
+            ),
+            self.orchestrator_connection,
+            lambda e: classify(e) == TRANSIENT
+        )
@@ -0,0 +1,227 @@
+"""This module reconciles the status of each form across the Excel workbooks, the OpenOrchestrator queue and the journalizing database.
+
+Run from the repository root:
+    python -m robot_framework.reconcile --path <workbook folder> --orchestrator <OpenOrchestrator connection string>
+        [--db <ODBC connection string> | --sqlite <database file>] [--report report.xlsx] [--requeue requeue.csv]
+
+The workbooks, a snapshot of the queue and a snapshot of the database statuses are loaded into DataFrames,
+joined on uuid, and every row is classified with vectorized column operations, so tens of thousands of rows
+take seconds. The report lists every discrepancy, and the re-queue list the forms that no system has handled
+and that have no live queue element. Without --db or --sqlite the database connection string is read from
+OpenOrchestrator. With --sqlite the file is attached as the 'journalizing' schema, as a local stand-in.
+Without --query the status query is read from the OpenOrchestrator constant config.RECONCILE_STATUS_QUERY.
+"""
+import argparse
+import glob
+import json
+import os
+from typing import TYPE_CHECKING
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+
+from robot_framework import config
+from robot_framework.status_ledger import STATUS_COLUMNS
+
+# pandas and numpy are imported where the snapshots are built, so importing this module stays cheap.
+if TYPE_CHECKING:
+    import pandas as pd
+
+# The number of queue elements read per round trip.
+QUEUE_PAGE_SIZE = 5000
+
+# Database statuses by the outcome they mean.
+DB_OUTCOMES = {"Successful": "ok", "Failed": "failed", "Manual": "manual", "InProgress": "in_progress"}
+
+MISSING = "missing"
+
+# Discrepancies in the order they are checked. A row gets the first that applies.
+ISSUES = (
+    "duplicate_in_workbooks",
+    "not_in_workbooks",
+    "marked_ok_and_failed",
+    "not_in_queue",
+    "in_progress",
+    "excel_not_marked",
+    "excel_contradicts_queue",
+    "db_not_written",
+    "db_contradicts_excel",
+)
+
+
+def load_workbooks(directory: str) -> "pd.DataFrame":
+    """Read the uuid and status columns of every workbook in a directory.
+
+    Returns:
+        A DataFrame with uuid, workbook, row (as numbered in Excel) and excel_status,
+        which is 'ok', 'failed', 'unhandled' or 'conflict' if a row is marked both ok and failed.
+    """
+    import numpy as np
+    import pandas as pd
+
+    frames = []
+    for workbook_path in sorted(glob.glob(os.path.join(glob.escape(directory), "*.xlsx"))):
+        name = os.path.basename(workbook_path)
+        if name.startswith("~$") or name.endswith(".tmp.xlsx"):
+            continue
+        df = pd.read_excel(workbook_path, engine="openpyxl", dtype=str,
+                           usecols=lambda column: column == "uuid" or column in STATUS_COLUMNS)
+        if "uuid" not in df.columns:
+            continue
+        df = df.reindex(columns=["uuid", *STATUS_COLUMNS])
+        df["workbook"] = name
+        df["row"] = df.index + 2  # The header is row 1
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame(columns=["uuid", "workbook", "row", "excel_status"])
+
+    df = pd.concat(frames, ignore_index=True)
+    df = df[df["uuid"].notna()]
+    ok = df["behandlet_ok"].fillna("").str.strip().str.lower() == "x"
+    failed = df["behandlet_fejl"].fillna("").str.strip().str.lower() == "x"
+    df["excel_status"] = np.select([ok & failed, ok, failed], ["conflict", "ok", "failed"], default="unhandled")
+    return df[["uuid", "workbook", "row", "excel_status"]]
+
+
+def load_queue(orchestrator_connection: OrchestratorConnection, queue_name: str = config.QUEUE_NAME) -> "pd.DataFrame":
+    """Read every element of the queue. A form queued more than once is represented by its newest element.
+
+    Returns:
+        A DataFrame with uuid, queue_status, queue_message and queue_data.
+    """
+    import pandas as pd
+
+    rows = []
+    offset = 0
+    while True:
+        page = orchestrator_connection.get_queue_elements(queue_name, offset=offset, limit=QUEUE_PAGE_SIZE)
+        rows.extend((_data_uuid(element.data), element.status.name, element.created_date, element.message, element.data) for element in page)
+        if len(page) < QUEUE_PAGE_SIZE:
+            break
+        offset += QUEUE_PAGE_SIZE
+
+    df = pd.DataFrame(rows, columns=["uuid", "queue_status", "queue_created", "queue_message", "queue_data"])
+    df = df[df["uuid"].notna()].sort_values("queue_created").drop_duplicates("uuid", keep="last")
+    return df.drop(columns="queue_created")
+
+
+def load_db_statuses(connection, query: str) -> "pd.DataFrame":
+    """Read the current status of every form from the journalizing database.
+
+    Args:
+        connection: A DB-API connection, e.g. from pyodbc or sqlite3.
+        query: A query returning (form_id, status) rows.
+
+    Returns:
+        A DataFrame with uuid and db_status, which is 'ok', 'failed', 'manual' or 'in_progress'.
+    """
+    import pandas as pd
+
+    cursor = connection.cursor()
+    cursor.execute(query)
+    df = pd.DataFrame.from_records([tuple(row) for row in cursor.fetchall()], columns=["uuid", "status"])
+    df["db_status"] = df["status"].map(DB_OUTCOMES).fillna(df["status"])
+    return df.drop_duplicates("uuid", keep="last")[["uuid", "db_status"]]
+
+
+def reconcile(workbooks: "pd.DataFrame", queue: "pd.DataFrame", db_statuses: "pd.DataFrame") -> "pd.DataFrame":
+    """Join the three snapshots on uuid and find the first discrepancy of every row.
+
+    Returns:
+        One row per workbook row, plus one per form only known to the queue,
+        with the statuses of all three systems and the issue, which is empty for consistent rows.
+    """
+    import numpy as np
+
+    df = workbooks.merge(queue, on="uuid", how="outer").merge(db_statuses, on="uuid", how="left")
+    df["excel_status"] = df["excel_status"].fillna(MISSING)
+    df["queue_status"] = df["queue_status"].fillna(MISSING)
+    df["db_status"] = df["db_status"].fillna(MISSING)
+    df["row"] = df["row"].astype("Int64")
+
+    excel, queue_status, db = df["excel_status"], df["queue_status"], df["db_status"]
+    handled = excel.isin(("ok", "failed"))
+    conditions = [
+        df["workbook"].notna() & df["uuid"].duplicated(keep=False),
+        excel == MISSING,
+        excel == "conflict",
+        queue_status == MISSING,
+        queue_status == "IN_PROGRESS",
+        (excel == "unhandled") & queue_status.isin(("DONE", "FAILED")),
+        ((excel == "ok") & (queue_status == "FAILED")) | ((excel == "failed") & (queue_status == "DONE")),
+        handled & db.isin((MISSING, "in_progress")),
+        handled & db.isin(("ok", "failed")) & (db != excel),
+    ]
+    df["issue"] = np.select(conditions, ISSUES, default="")
+    return df.sort_values(["workbook", "row"], na_position="last").reset_index(drop=True)
+
+
+def requeue_list(report: "pd.DataFrame") -> "pd.DataFrame":
+    """The forms in a workbook that no system has handled and that have no element waiting or running in the queue."""
+    unhandled = (report["excel_status"] == "unhandled") & ~report["db_status"].isin(("ok", "failed", "manual"))
+    no_live_element = report["queue_status"].isin((MISSING, "FAILED", "ABANDONED"))
+    return report.loc[unhandled & no_live_element, ["uuid", "workbook", "row", "queue_status", "queue_data"]]
+
+
+def _data_uuid(data: str | None) -> str | None:
+    """The form uuid in a queue element's JSON data."""
+    try:
+        return json.loads(data).get("uuid")
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def _connect_db(args: argparse.Namespace, orchestrator_connection: OrchestratorConnection):
+    if args.sqlite:
+        import sqlite3
+        connection = sqlite3.connect(":memory:")
+        connection.execute("ATTACH DATABASE ? AS journalizing", (args.sqlite,))
+        return connection
+
+    import pyodbc
+    return pyodbc.connect(args.db or orchestrator_connection.get_constant(config.DB_CONNECTION_STRING).value)
+
+
+def _write(df: "pd.DataFrame", path: str) -> None:
+    if path.endswith(".xlsx"):
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def main():
+    """Reconcile the workbooks in a folder with the queue and the database, and write the report and re-queue list."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--path", required=True, help="The folder with the workbooks, as in the robot's process arguments.")
+    parser.add_argument("--orchestrator", required=True, help="The connection string of the OpenOrchestrator database.")
+    database = parser.add_mutually_exclusive_group()
+    database.add_argument("--db", help="The ODBC connection string of the journalizing database. Read from OpenOrchestrator if omitted.")
+    database.add_argument("--sqlite", help="An SQLite file standing in for the journalizing database.")
+    parser.add_argument("--query", help="The query returning (form_id, status) rows. Read from OpenOrchestrator if omitted.")
+    parser.add_argument("--report", default="reconciliation.xlsx", help="Where to write the discrepancy report (.xlsx or .csv).")
+    parser.add_argument("--requeue", help="Where to write the re-queue list (.xlsx or .csv), if wanted.")
+    args = parser.parse_args()
+
+    orchestrator_connection = OrchestratorConnection("reconcile", args.orchestrator, None, "{}")
+    query = args.query or orchestrator_connection.get_constant(config.RECONCILE_STATUS_QUERY).value
+    connection = _connect_db(args, orchestrator_connection)
+    try:
+        report = reconcile(load_workbooks(args.path), load_queue(orchestrator_connection), load_db_statuses(connection, query))
+    finally:
+        connection.close()
+
+    discrepancies = report[report["issue"] != ""]
+    _write(discrepancies.drop(columns="queue_data"), args.report)
+    print(f"{len(report)} forms, {len(discrepancies)} discrepancies written to {args.report}.")
+    print(report["excel_status"].value_counts().to_string())
+    if len(discrepancies):
+        print(discrepancies["issue"].value_counts().to_string())
+
+    if args.requeue:
+        requeue = requeue_list(report)
+        _write(requeue, args.requeue)
+        print(f"{len(requeue)} forms to re-queue written to {args.requeue}.")
+
+
+if __name__ == "__main__":
+    main()
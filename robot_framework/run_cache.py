@@ -0,0 +1,71 @@
+"""This module contains a run-scoped cache of OpenOrchestrator constants, credentials and process arguments."""
+import json
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+
+
+class AuthenticationError(Exception):
+    """Raised when a cached secret is rejected by the system it is used against."""
+
+
+class RunCache:
+    """Resolves constants, credentials and process arguments once per run.
+    Call invalidate when a cached value is rejected, and the next lookup refetches it from OpenOrchestrator.
+    """
+
+    def __init__(self, orchestrator_connection: OrchestratorConnection):
+        self.orchestrator_connection = orchestrator_connection
+        self._process_args = None
+        self._constants = {}
+        self._credentials = {}
+
+    @property
+    def process_args(self) -> dict:
+        """The process arguments decoded from JSON."""
+        if self._process_args is None:
+            self._process_args = json.loads(self.orchestrator_connection.process_arguments)
+        return self._process_args
+
+    def get_constant(self, name: str) -> str:
+        """Get the value of a constant."""
+        if name not in self._constants:
+            self._constants[name] = self.orchestrator_connection.get_constant(name).value
+        return self._constants[name]
+
+    def get_credential(self, name: str):
+        """Get a credential. The returned object has a username and a password."""
+        if name not in self._credentials:
+            self._credentials[name] = self.orchestrator_connection.get_credential(name)
+        return self._credentials[name]
+
+    def invalidate(self, name: str) -> None:
+        """Drop a cached constant or credential so the next lookup refetches it."""
+        self.orchestrator_connection.log_trace(f"Invalidating cached value '{name}'.")
+        self._constants.pop(name, None)
+        self._credentials.pop(name, None)
+
+    def preload(self, constants: tuple[str, ...] = (), credentials: tuple[str, ...] = ()) -> None:
+        """Resolve the process arguments and the given constants and credentials up front."""
+        _ = self.process_args
+        for name in constants:
+            self.get_constant(name)
+        for name in credentials:
+            self.get_credential(name)
+
+
+def call_with_refresh(run_cache: RunCache, name: str, func: callable):
+    """Call func and, if it raises AuthenticationError, invalidate the cached value and call it once more.
+
+    Args:
+        run_cache: The run cache holding the value.
+        name: The name of the constant or credential func depends on.
+        func: A function without arguments that reads the value from run_cache.
+
+    Returns:
+        The return value of func.
+    """
+    try:
+        return func()
+    except AuthenticationError:
+        run_cache.invalidate(name)
+        return func()
@@ -0,0 +1,160 @@
+"""This module contains the status ledger, which batches the Excel status marks of handled queue elements.
+
+Each workbook is opened with a WorkbookPatcher, which indexes its rows by uuid and reads the workbook
+again when another process has changed it. Marks are written to an append-only journal next to the
+workbook before they are acknowledged, and when a batch is flushed only the status cells of the marked
+rows are changed in a fresh copy of the workbook, so the writes of the pipeline's other robots are kept.
+"""
+import glob
+import json
+import os
+import threading
+import time
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+
+from robot_framework import config
+from robot_framework.workbook_patcher import WorkbookPatcher
+
+STATUS_COLUMNS = ('behandlet_fejl', 'behandlet_ok')
+JOURNAL_SUFFIX = '.journal.jsonl'
+
+
+# pylint: disable-next = too-many-instance-attributes
+class StatusLedger:
+    """Collects success/failure marks for queue elements and flushes them to the workbooks in batches."""
+
+    def __init__(self, orchestrator_connection: OrchestratorConnection, flush_every: int = config.LEDGER_FLUSH_EVERY,
+                 flush_interval: float = config.LEDGER_FLUSH_INTERVAL):
+        """
+        Args:
+            orchestrator_connection: The connection to log failed flushes to.
+            flush_every: Flush when this many marks are pending.
+            flush_interval: Flush pending marks at least this often, in seconds.
+        """
+        self.orchestrator_connection = orchestrator_connection
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._workbooks: dict[str, WorkbookPatcher] = {}
+        self._pending: dict[str, dict[str, bool]] = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._timer = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._timer.start()
+
+    def mark(self, workbook_path: str, uuid: str, failed: bool) -> None:
+        """Record the status of an element. The mark is journaled before returning.
+
+        Args:
+            workbook_path: The path of the workbook containing the element.
+            uuid: The uuid of the element.
+            failed: Whether the element failed.
+        """
+        with self._lock:
+            self._load(workbook_path)
+            if uuid not in self._workbooks[workbook_path]:
+                raise ValueError(f"uuid {uuid} not found in {workbook_path}.")
+
+            _append_journal(workbook_path, uuid, failed)
+            self._pending[workbook_path][uuid] = failed
+
+            if self.pending_count() >= self.flush_every:
+                self._try_flush()
+
+    def contains(self, workbook_path: str, uuid: str) -> bool:
+        """Whether the workbook has a row for the element."""
+        with self._lock:
+            self._load(workbook_path)
+            self._workbooks[workbook_path].refresh()
+            return uuid in self._workbooks[workbook_path]
+
+    def pending_count(self) -> int:
+        """The number of marks not yet written to a workbook."""
+        with self._lock:
+            return sum(len(marks) for marks in self._pending.values())
+
+    def flush(self) -> None:
+        """Write all pending marks to their workbooks and clear the journals."""
+        with self._lock:
+            for workbook_path, marks in self._pending.items():
+                if not marks:
+                    continue
+
+                workbook = self._workbooks[workbook_path]
+                for uuid, failed in marks.items():
+                    workbook.set(uuid, 'behandlet_fejl' if failed else 'behandlet_ok', 'x')
+                    workbook.set(uuid, 'behandlet_ok' if failed else 'behandlet_fejl', ' ')
+
+                workbook.save()
+                _remove_journal(workbook_path)
+                marks.clear()
+
+    def recover(self, directory: str) -> None:
+        """Flush the journals left in a directory by a run that died before flushing."""
+        with self._lock:
+            for journal in glob.glob(os.path.join(glob.escape(directory), f"*{JOURNAL_SUFFIX}")):
+                workbook_path = journal[:-len(JOURNAL_SUFFIX)]
+                if os.path.exists(workbook_path):
+                    self._load(workbook_path)
+            self.flush()
+
+    def close(self) -> None:
+        """Stop the flush timer and flush any remaining marks."""
+        self._stop.set()
+        self._timer.join()
+        self.flush()
+
+    def _load(self, workbook_path: str) -> None:
+        """Read a workbook once and replay any journal left behind by an earlier run."""
+        if workbook_path in self._workbooks:
+            return
+
+        self._workbooks[workbook_path] = WorkbookPatcher(workbook_path)
+        self._pending[workbook_path] = _read_journal(workbook_path)
+
+    def _flush_periodically(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self._try_flush()
+
+    def _try_flush(self) -> None:
+        """Flush, and only log if it fails. The marks stay journaled and pending, so a later flush retries them."""
+        try:
+            self.flush()
+        # A workbook can be locked by Excel, and a failed flush must neither fail the element nor stop the timer.
+        # pylint: disable-next = broad-exception-caught
+        except Exception as e:
+            self.orchestrator_connection.log_error(f"Flushing {self.pending_count()} Excel status marks failed: {e!r}")
+
+
+def _journal_path(workbook_path: str) -> str:
+    return workbook_path + JOURNAL_SUFFIX
+
+
+def _append_journal(workbook_path: str, uuid: str, failed: bool) -> None:
+    with open(_journal_path(workbook_path), 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'uuid': uuid, 'failed': failed, 'time': time.time()}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _read_journal(workbook_path: str) -> dict[str, bool]:
+    """Read the marks of a journal. A partially written last line from a crash is ignored."""
+    marks = {}
+    path = _journal_path(workbook_path)
+    if not os.path.exists(path):
+        return marks
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            marks[entry['uuid']] = entry['failed']
+    return marks
+
+
+def _remove_journal(workbook_path: str) -> None:
+    path = _journal_path(workbook_path)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,146 @@
+"""This module contains the status writer, which sends element statuses to the journalizing database over one pooled connection."""
+import threading
+import time
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+
+from robot_framework import config
+from robot_framework.checkpoint import checkpoints, DB_WRITTEN
+from robot_framework.run_cache import RunCache
+
+STORED_PROCEDURE = "journalizing.sp_update_status"
+
+# SQLSTATEs worth retrying on a fresh connection: lost/refused connections, timeouts and deadlocks.
+TRANSIENT_SQLSTATES = ('08001', '08S01', '08004', 'HYT00', 'HYT01', '40001')
+LOGIN_FAILED_SQLSTATE = '28000'
+
+TYPE_MAPPING = {"str": str, "int": int, "float": float}
+
+# Statuses that end an element, and are recorded in the checkpoint journal once written.
+TERMINAL_STATUSES = ("Successful", "Failed", "Manual")
+
+
+# pylint: disable-next = too-many-instance-attributes
+class StatusWriter:
+    """Writes 'journalizing.sp_update_status' calls for the run over one shared connection.
+    InProgress is written at once, terminal statuses are queued and written in batches
+    of config.STATUS_FLUSH_EVERY, when config.STATUS_FLUSH_INTERVAL has passed and at shutdown.
+    A timer thread flushes a batch that is due even if no more statuses are queued.
+    """
+
+    def __init__(self, orchestrator_connection: OrchestratorConnection, run_cache: RunCache,
+                 flush_every: int = config.STATUS_FLUSH_EVERY, flush_interval: float = config.STATUS_FLUSH_INTERVAL):
+        self.orchestrator_connection = orchestrator_connection
+        self.run_cache = run_cache
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._connection = None
+        self._pending: list[dict] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._timer = threading.Thread(target=self._flush_periodically, name="status_writer", daemon=True)
+        self._timer.start()
+
+    def write(self, db_status: dict) -> None:
+        """Write a status right away."""
+        with self._lock:
+            if self._execute([db_status]):
+                _checkpoint([db_status])
+
+    def queue(self, db_status: dict) -> None:
+        """Queue a terminal status and flush if the batch is full or due."""
+        with self._lock:
+            self._pending.append(db_status)
+            if len(self._pending) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self) -> None:
+        """Write all queued statuses in one transaction."""
+        with self._lock:
+            if self._pending:
+                if self._execute(self._pending):
+                    _checkpoint(self._pending)
+                self._pending = []
+            self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        """Stop the flush timer, flush the queued statuses and close the connection."""
+        self._stop.set()
+        self._timer.join()
+        with self._lock:
+            self.flush()
+            self._disconnect()
+
+    def _flush_periodically(self) -> None:
+        while not self._stop.wait(min(self.flush_interval, 1)):
+            with self._lock:
+                if not self._pending or time.monotonic() - self._last_flush < self.flush_interval:
+                    continue
+                try:
+                    self.flush()
+                # A failed flush must not stop the timer. Failed statuses are logged by _execute.
+                # pylint: disable-next = broad-exception-caught
+                except Exception as e:
+                    self.orchestrator_connection.log_error(f"Flushing {len(self._pending)} statuses failed: {e!r}")
+
+    def _execute(self, statuses: list[dict]) -> bool:
+        """Execute the stored procedure for each status, reconnecting and retrying on transient errors.
+        Failures are logged rather than raised, so a database outage doesn't stop the queue.
+
+        Returns:
+            Whether the statuses were written.
+        """
+        import pyodbc
+        for attempt in range(1, config.STATUS_WRITE_RETRIES + 1):
+            try:
+                cursor = self._connect().cursor()
+                for db_status in statuses:
+                    sql, values = _build_call(db_status)
+                    cursor.execute(sql, values)
+                self._connection.commit()
+                return True
+
+            except pyodbc.Error as e:
+                sqlstate = e.args[0] if e.args else ''
+                self._disconnect()
+                if sqlstate == LOGIN_FAILED_SQLSTATE:
+                    self.run_cache.invalidate(config.DB_CONNECTION_STRING)
+                elif sqlstate not in TRANSIENT_SQLSTATES:
+                    self.orchestrator_connection.log_error(f"Writing {len(statuses)} statuses to {STORED_PROCEDURE} failed: {e}")
+                    return False
+
+                self.orchestrator_connection.log_trace(f"Transient database error on attempt {attempt}: {e}")
+                time.sleep(config.STATUS_WRITE_BACKOFF * attempt)
+
+        self.orchestrator_connection.log_error(f"Gave up writing {len(statuses)} statuses to {STORED_PROCEDURE} after {config.STATUS_WRITE_RETRIES} attempts.")
+        return False
+
+    def _connect(self):
+        import pyodbc
+        if self._connection is None:
+            self._connection = pyodbc.connect(self.run_cache.get_constant(config.DB_CONNECTION_STRING))
+        return self._connection
+
+    def _disconnect(self) -> None:
+        if self._connection is not None:
+            import pyodbc
+            try:
+                self._connection.close()
+            except pyodbc.Error:
+                pass
+            self._connection = None
+
+
+def _build_call(db_status: dict) -> tuple[str, tuple]:
+    """Build the EXEC statement and its values from a dict of name: (type, value)."""
+    placeholders = ', '.join(f"@{key} = ?" for key in db_status)
+    values = tuple(TYPE_MAPPING.get(value_type, lambda v: v)(value) for value_type, value in db_status.values())
+    return f"EXEC {STORED_PROCEDURE} {placeholders}", values
+
+
+def _checkpoint(statuses: list[dict]) -> None:
+    """Record the written terminal statuses in the checkpoint journal."""
+    for db_status in statuses:
+        if db_status["Status"][1] in TERMINAL_STATUSES:
+            checkpoints.record(db_status["form_id"][1], DB_WRITTEN)
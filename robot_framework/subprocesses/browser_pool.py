@@ -0,0 +1,124 @@
+"""This module launches the OPUS browsers, each with its own persistent profile directory, and can launch the first one ahead of time.
+
+Chrome locks a profile directory while it runs, so every browser gets a numbered directory under
+config.BROWSER_PROFILE_DIR that no other browser is using. A directory is reserved by holding an OS lock on
+a lock file next to it, so robots running side by side on one host never share a directory, and the lock
+is released by the OS if the robot dies. The directories are kept between runs, so the
+portal's static assets are served from Chrome's cache. A warm start launches a browser in the background
+while the robot initializes, and the first session to need a browser takes it over.
+"""
+import os
+import threading
+from typing import IO
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+from selenium.common.exceptions import WebDriverException
+
+from robot_framework import config
+from robot_framework.subprocesses.outlay_ticket_creation import initialize_browser
+
+
+class BrowserPool:
+    """Launches browsers and keeps track of the profile directories in use."""
+
+    def __init__(self):
+        self._profiles_in_use: dict[str, IO] = {}
+        self._warm: Future | None = None
+        self._lock = threading.Lock()
+
+    def launch(self, orchestrator_connection: OrchestratorConnection):
+        """Get a browser, taking over the warm-started one if there is one.
+
+        Returns:
+            The browser and its profile directory, to be passed to `release` when the browser is closed.
+        """
+        with self._lock:
+            warm, self._warm = self._warm, None
+        if warm is not None:
+            try:
+                return warm.result()
+            except WebDriverException as e:
+                orchestrator_connection.log_info(f"The warm-started OPUS browser failed to launch, launching a new one: {e.msg}")
+
+        return self._launch()
+
+    def warm_start(self, orchestrator_connection: OrchestratorConnection) -> None:
+        """Start launching a browser in the background."""
+        with self._lock:
+            if self._warm is not None:
+                return
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="browser_warm_start")
+            self._warm = executor.submit(self._launch)
+            executor.shutdown(wait=False)
+        orchestrator_connection.log_trace("Launching the OPUS browser in the background.")
+
+    def release(self, profile_dir: str | None) -> None:
+        """Make a closed browser's profile directory available again."""
+        with self._lock:
+            lock_file = self._profiles_in_use.pop(profile_dir, None)
+        if lock_file is not None:
+            lock_file.close()  # Closing the file releases its lock
+
+    def close(self, orchestrator_connection: OrchestratorConnection) -> None:
+        """Quit the warm-started browser if no session took it over."""
+        with self._lock:
+            warm, self._warm = self._warm, None
+        if warm is None:
+            return
+        try:
+            browser, profile_dir = warm.result()
+            browser.quit()
+            self.release(profile_dir)
+        except WebDriverException as e:
+            orchestrator_connection.log_trace(f"Closing the warm-started OPUS browser failed: {e.msg}")
+
+    def _launch(self):
+        profile_dir = self._acquire_profile()
+        try:
+            return initialize_browser(profile_dir), profile_dir
+        except BaseException:
+            self.release(profile_dir)
+            raise
+
+    def _acquire_profile(self) -> str | None:
+        """Reserve the lowest numbered profile directory not in use by this or another process,
+        or None for an incognito profile.
+        """
+        if not config.BROWSER_PROFILE_DIR:
+            return None
+        os.makedirs(config.BROWSER_PROFILE_DIR, exist_ok=True)
+        with self._lock:
+            index = 0
+            while True:
+                profile_dir = os.path.join(config.BROWSER_PROFILE_DIR, str(index))
+                if profile_dir not in self._profiles_in_use:
+                    lock_file = _try_lock(profile_dir + ".lock")
+                    if lock_file is not None:
+                        self._profiles_in_use[profile_dir] = lock_file
+                        return profile_dir
+                index += 1
+
+
+def _try_lock(path: str) -> IO | None:
+    """Open a lock file and take an exclusive, non-blocking OS lock on it.
+
+    Returns:
+        The open lock file, which holds the lock until it is closed, or None if another process holds the lock.
+    """
+    lock_file = open(path, "a+b")  # pylint: disable=consider-using-with
+    try:
+        if os.name == "nt":
+            import msvcrt  # pylint: disable=import-error
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl  # pylint: disable=import-error
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+pool = BrowserPool()
@@ -0,0 +1,126 @@
+"""This module contains the interaction primitives used against OPUS.
+
+Every wait has a deadline: its own step timeout, capped by the time left of the ticket being created.
+A click or text entry that can't succeed before its deadline raises at once instead of returning quietly,
+and the latency of every step is recorded in a histogram.
+"""
+import bisect
+import threading
+import time
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import (
+    ElementClickInterceptedException, ElementNotInteractableException, NoSuchElementException,
+    StaleElementReferenceException, TimeoutException
+)
+
+from robot_framework import config
+
+RETRYABLE_EXCEPTIONS = (
+    ElementClickInterceptedException, ElementNotInteractableException, NoSuchElementException, StaleElementReferenceException
+)
+
+# Upper bounds in seconds of the latency histogram buckets. Slower steps land in a final overflow bucket.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+# The deadline of the ticket being created, per worker thread.
+_ticket = threading.local()
+
+
+class TicketBudgetExceeded(TimeoutException):
+    """Raised when a ticket has used its whole time budget."""
+
+
+def start_ticket(budget: float = config.TICKET_BUDGET) -> None:
+    """Start the time budget of a ticket for the current worker."""
+    _ticket.deadline = time.monotonic() + budget
+
+
+def end_ticket() -> None:
+    """Remove the time budget of the current worker's ticket."""
+    _ticket.deadline = None
+
+
+def remaining(timeout: float) -> float:
+    """Cap a step timeout by the time left of the current ticket.
+
+    Raises:
+        TicketBudgetExceeded: If the ticket has no time left.
+    """
+    deadline = getattr(_ticket, "deadline", None)
+    if deadline is None:
+        return timeout
+
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TicketBudgetExceeded(f"The ticket used its whole budget of {config.TICKET_BUDGET} seconds.")
+    return min(timeout, left)
+
+
+def wait_until(browser, condition, timeout: float, step: str, message: str = ""):
+    """Wait for a condition within the step's deadline and record how long it took."""
+    start = time.perf_counter()
+    result = WebDriverWait(browser, remaining(timeout), poll_frequency=config.OPUS_TIMING["poll"]).until(condition, message)
+    histograms.record(step, time.perf_counter() - start)
+    return result
+
+
+def click(browser, by, value, step: str, timeout: float = config.STEP_TIMEOUT) -> None:
+    """Click an element as soon as it is displayed and enabled.
+
+    Raises:
+        TimeoutException: If the click didn't succeed before the deadline.
+    """
+    def attempt(driver):
+        try:
+            element = driver.find_element(by, value)
+            if not (element.is_displayed() and element.is_enabled()):
+                return False
+            element.click()
+            return True
+        except RETRYABLE_EXCEPTIONS:
+            return False
+
+    wait_until(browser, attempt, timeout, step, f"Could not click '{step}'.")
+
+
+def type_text(browser, by, value, text, *, step: str, timeout: float = config.STEP_TIMEOUT) -> None:
+    """Send text to an element as soon as it is present.
+
+    Raises:
+        TimeoutException: If the text couldn't be entered before the deadline.
+    """
+    def attempt(driver):
+        try:
+            driver.find_element(by, value).send_keys(text)
+            return True
+        except RETRYABLE_EXCEPTIONS:
+            return False
+
+    wait_until(browser, attempt, timeout, step, f"Could not enter text in '{step}'.")
+
+
+class LatencyHistograms:
+    """Latency histograms of interaction steps, shared by all workers."""
+
+    def __init__(self):
+        self._counts: dict[str, list[int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, step: str, seconds: float) -> None:
+        """Count a step duration in its bucket."""
+        with self._lock:
+            counts = self._counts.setdefault(step, [0] * (len(LATENCY_BUCKETS) + 1))
+            counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def report(self, orchestrator_connection: OrchestratorConnection) -> None:
+        """Log the histogram of every step."""
+        labels = [f"<={bound}s" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+        with self._lock:
+            for step, counts in sorted(self._counts.items()):
+                buckets = ", ".join(f"{label}: {count}" for label, count in zip(labels, counts) if count)
+                orchestrator_connection.log_trace(f"Step '{step}' latency: {buckets}")
+
+
+histograms = LatencyHistograms()
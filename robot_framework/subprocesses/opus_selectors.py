@@ -0,0 +1,152 @@
+"""This module contains the selector registry for the OPUS outlay form.
+
+Every field the robot touches has one logical name and an ordered list of locator strategies.
+Label- and id-based strategies come first and the absolute XPaths recorded from the portal come last.
+The strategy that resolves a name is remembered for the rest of the run and tried first next time.
+"""
+import threading
+import time
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+from robot_framework import config
+
+# Resolve a field through the 'for' attribute of the <label> with the given text.
+LABEL = "label"
+
+FORM_ROOT_XPATH = "/html/body/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr[2]/td/div/div/table/tbody/tr[2]/td/table/tbody/tr/td/div/div[1]/div/div/div/table/tbody/tr[1]/td/div/div/table/tbody/tr/td[1]/div/div/table/tbody/tr/td/div/div/table/tbody/"
+TOOLBAR_XPATH = "/html/body/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr[1]/td/div/div[2]/div/div/div/"
+
+
+def _button(text: str) -> list[tuple[str, str]]:
+    """The strategies for a Web Dynpro button with the given text."""
+    return [
+        (By.CSS_SELECTOR, f"div.lsButton[title='{text}']"),
+        (By.XPATH, f"//div[contains(@class, 'lsButton')][normalize-space()='{text}']"),
+    ]
+
+
+SELECTORS: dict[str, list[tuple[str, str]]] = {
+    # Portal navigation
+    "min_oekonomi": [(By.XPATH, "//div[text()='Min Økonomi']")],
+    "bilag_og_fakturaer": [(By.XPATH, "//div[text()='Bilag og fakturaer']")],
+    "udgiftsbilag": [(By.XPATH, "/html/body/div[1]/table/tbody/tr[1]/td/div/div[1]/div[9]/div[2]/span[2]")],
+
+    # Outlay form
+    "kreditor": [
+        (LABEL, "Kreditor"),
+        (By.XPATH, FORM_ROOT_XPATH + "tr[2]/td/div/div/table/tbody/tr/td[1]/div/div/table/tbody/tr[1]/td[2]/div/div/table/tbody/tr/td[1]/span/input"),
+    ],
+    "hent": _button("Hent") + [
+        (By.XPATH, FORM_ROOT_XPATH + "tr[2]/td/div/div/table/tbody/tr/td[1]/div/div/table/tbody/tr[1]/td[2]/div/div/table/tbody/tr/td[2]/div"),
+    ],
+    "udbetalingstekst": [
+        (LABEL, "Udbetalingstekst"),
+        (By.XPATH, FORM_ROOT_XPATH + "tr[3]/td/div/div/table/tbody/tr[1]/td[1]/div/div/table/tbody/tr/td/div/div/table/tbody/tr[1]/td[2]/span/input"),
+    ],
+    "udbetalingstekst_detaljer": [
+        (By.XPATH, FORM_ROOT_XPATH + "tr[3]/td/div/div/table/tbody/tr[1]/td[1]/div/div/table/tbody/tr/td/div/div/table/tbody/tr[1]/td[3]/div"),
+    ],
+    "posteringstekst": [
+        (LABEL, "Posteringstekst"),
+        (By.XPATH, FORM_ROOT_XPATH + "tr[3]/td/div/div/table/tbody/tr[2]/td/div/div/table/tbody/tr[2]/td[2]/span/input"),
+    ],
+    "reference": [
+        (LABEL, "Reference"),
+        (By.XPATH, FORM_ROOT_XPATH + "tr[3]/td/div/div/table/tbody/tr[2]/td/div/div/table/tbody/tr[3]/td[2]/span/input"),
+    ],
+    "beloeb": [
+        (LABEL, "Beløb"),
+        (By.XPATH, FORM_ROOT_XPATH + "tr[3]/td/div/div/table/tbody/tr[2]/td/div/div/table/tbody/tr[4]/td[2]/div/div/table/tbody/tr/td[1]/span/input"),
+    ],
+    "naeste_agent": [
+        (LABEL, "Næste agent"),
+        (By.XPATH, FORM_ROOT_XPATH + "tr[4]/td/div/div/table/tbody/tr[2]/td[2]/div/div/table/tbody/tr[1]/td[1]/span/input"),
+    ],
+    "artskonto_celle": [
+        (By.XPATH, "/html/body/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr[2]/td/div/div/table/tbody/tr[2]/td/table/tbody/tr/td/div/div[1]/div/div/div/table/tbody/tr[2]/td/div/span/span[1]/div/span/span[1]/div/div/div/span/span/table/tbody/tr[2]/td/div/table/tbody/tr/td/div/table/tbody/tr[1]/td/table/tbody/tr[2]/td[3]/table/tbody/tr/td/span"),
+    ],
+
+    # Attachments
+    "vedhaeft_nyt": _button("Vedhæft nyt") + [
+        (By.XPATH, "/html/body/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr[2]/td/div/div/table/tbody/tr[2]/td/table/tbody/tr/td/div/div[1]/div/div/div/table/tbody/tr[1]/td/div/div/table/tbody/tr/td[2]/table/tbody/tr/td/div/table/tbody/tr[3]/td/div/span/span/div/span/span[1]/table/thead/tr[2]/th/div/div/div/span/div"),
+    ],
+    "vedhaeft_ok": _button("OK") + [
+        (By.XPATH, "/html/body/table/tbody/tr/td/div/div[1]/div/div[4]/div/table/tbody/tr/td[3]/table/tbody/tr/td[1]/div"),
+    ],
+
+    # Toolbar
+    "kontroller": _button("Kontroller") + [(By.XPATH, TOOLBAR_XPATH + "span[4]/div")],
+    "opret": _button("Opret") + [(By.XPATH, TOOLBAR_XPATH + "span[1]/div")],
+}
+
+
+class SelectorRegistry:
+    """Resolves logical field names to locators and keeps timing statistics per name."""
+
+    def __init__(self, selectors: dict[str, list[tuple[str, str]]]):
+        self.selectors = selectors
+        self._winners: dict[str, int] = {}
+        self._timings: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def locate(self, browser, name: str, timeout: float = config.SELECTOR_TIMEOUT) -> tuple[str, str]:
+        """Wait until one of the strategies of a name matches an element in the current frame.
+        All strategies are tried on every poll, the remembered winner first.
+
+        Returns:
+            The matching locator as a (by, value) tuple.
+
+        Raises:
+            TimeoutException: If no strategy matched within the timeout.
+        """
+        strategies = list(enumerate(self.selectors[name]))
+        winner = self._winners.get(name)
+        if winner is not None:
+            strategies.insert(0, strategies.pop(winner))
+
+        start = time.perf_counter()
+        index, locator = WebDriverWait(browser, timeout, poll_frequency=config.OPUS_TIMING["poll"]).until(
+            lambda driver: _first_match(driver, strategies),
+            message=f"No selector for '{name}' matched."
+        )
+
+        with self._lock:
+            self._winners[name] = index
+            self._timings.setdefault(name, []).append(time.perf_counter() - start)
+        return locator
+
+    def report(self, orchestrator_connection: OrchestratorConnection) -> None:
+        """Log the resolution time and the winning strategy of every name used in the run."""
+        with self._lock:
+            for name, durations in sorted(self._timings.items()):
+                by, _ = self.selectors[name][self._winners[name]]
+                orchestrator_connection.log_trace(
+                    f"Selector '{name}': {len(durations)} lookups, {sum(durations) / len(durations) * 1000:.0f} ms average, "
+                    f"{max(durations) * 1000:.0f} ms max, strategy #{self._winners[name]} ({by})."
+                )
+
+
+def _first_match(browser, strategies):
+    """Get the first strategy that matches an element, as (index, locator), or False if none match."""
+    for index, (by, value) in strategies:
+        locator = _resolve(browser, by, value)
+        if locator:
+            return index, locator
+    return False
+
+
+def _resolve(browser, by, value) -> tuple[str, str] | None:
+    if by == LABEL:
+        for label in browser.find_elements(By.XPATH, f"//label[normalize-space()='{value}']"):
+            field_id = label.get_attribute("for")
+            if field_id and browser.find_elements(By.ID, field_id):
+                return By.ID, field_id
+        return None
+
+    return (by, value) if browser.find_elements(by, value) else None
+
+
+registry = SelectorRegistry(SELECTORS)
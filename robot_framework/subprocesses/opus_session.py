@@ -0,0 +1,148 @@
+"""This module contains the OPUS session, which keeps track of the state of the outlay form between tickets."""
+import time
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import WebDriverException
+
+from robot_framework import config
+from robot_framework.run_cache import RunCache
+from robot_framework.timing import timings
+from robot_framework.subprocesses.browser_pool import pool
+from robot_framework.subprocesses.opus_selectors import registry
+from robot_framework.subprocesses.outlay_ticket_creation import (
+    login_required, login_to_opus, navigate_to_opus, portal_idle, switch_to_frame, wait_for
+)
+
+UNKNOWN = "unknown"
+EDITING = "editing"
+SUBMITTED = "submitted"
+
+
+class OpusSession:
+    """Owns the OPUS browser and opens a blank outlay form as cheaply as the page state allows.
+    The browser is launched on the first form, or taken over from the warm start, and relaunched only if it stops responding.
+    The portal login happens when the portal shows its logon page, i.e. on the first navigation and when the session has expired.
+    After a ticket has been created the form is reset in place with the portal's 'new document' action.
+    In any other state, or if the reset can't be verified, the full portal navigation is used.
+    """
+
+    def __init__(self, orchestrator_connection: OrchestratorConnection, run_cache: RunCache):
+        self.orchestrator_connection = orchestrator_connection
+        self.run_cache = run_cache
+        self.browser = None
+        self.profile_dir = None
+        self.logged_in = False
+        self.state = UNKNOWN
+        self.timings: dict[str, list[float]] = {"launch": [], "load": [], "login": [], "reset": [], "navigate": []}
+
+    def open_form(self):
+        """Bring the browser to a blank outlay form.
+
+        Returns:
+            The browser showing the form.
+        """
+        self._ensure_browser()
+
+        start = time.perf_counter()
+        if self.state == SUBMITTED and self._reset_form():
+            self._record("reset", start)
+        else:
+            self.state = UNKNOWN
+            start = time.perf_counter()
+            self.browser.get(config.OPUS_PORTAL_URL)
+            self._record("load", start)
+            if login_required(self.browser):
+                self._login()
+            start = time.perf_counter()
+            navigate_to_opus(self.browser)
+            self._record("navigate", start)
+        self.state = EDITING
+        return self.browser
+
+    def submitted(self) -> None:
+        """Note that the form was submitted and OPUS confirmed the ticket."""
+        self.state = SUBMITTED
+
+    def invalidate(self) -> None:
+        """Forget the page state, so the next form is opened with the full navigation."""
+        self.state = UNKNOWN
+
+    def close(self) -> None:
+        """Close the browser, if one was launched."""
+        if self.browser is None:
+            return
+        try:
+            self.browser.quit()
+        except WebDriverException as e:
+            self.orchestrator_connection.log_trace(f"Closing the OPUS browser failed: {e.msg}")
+        pool.release(self.profile_dir)
+        self.browser = None
+        self.profile_dir = None
+        self.state = UNKNOWN
+
+    def report(self) -> None:
+        """Log the number and cost of browser launches, portal page loads, logins, form resets and full navigations."""
+        for kind, durations in self.timings.items():
+            if durations:
+                self.orchestrator_connection.log_info(
+                    f"OPUS {kind}: {len(durations)} times, {sum(durations):.1f}s total, {sum(durations) / len(durations):.2f}s average."
+                )
+
+    def _ensure_browser(self) -> None:
+        """Launch the browser if there is none, or replace it if it no longer responds."""
+        if self.browser is not None and not self._alive():
+            self.orchestrator_connection.log_info("The OPUS browser is not responding, launching a new one.")
+            self.close()
+
+        if self.browser is None:
+            start = time.perf_counter()
+            self.browser, self.profile_dir = pool.launch(self.orchestrator_connection)
+            self.logged_in = False
+            self.state = UNKNOWN
+            self._record("launch", start)
+
+    def _alive(self) -> bool:
+        """Probe the browser with a trivial script."""
+        try:
+            self.browser.execute_script("return document.readyState")
+            return True
+        except WebDriverException:
+            return False
+
+    def _login(self) -> None:
+        """Log in from the portal's logon page."""
+        start = time.perf_counter()
+        if self.logged_in:
+            self.orchestrator_connection.log_info("The OPUS session has expired, logging in again.")
+        credential = self.run_cache.get_credential(config.OPUS_CREDENTIAL)
+        login_to_opus(self.browser, credential.username, credential.password)
+        self.logged_in = True
+        self._record("login", start)
+
+    def _reset_form(self) -> bool:
+        """Click the 'new document' action and verify that an empty form is shown."""
+        try:
+            self.browser.switch_to.default_content()
+            switch_to_frame(self.browser, 'contentAreaFrame')
+            switch_to_frame(self.browser, 'ivuFrm_page0ivu0')
+
+            buttons = [button for button in self.browser.find_elements(By.CLASS_NAME, "lsButton")
+                       if button.text.strip().lower() in config.OPUS_NEW_DOCUMENT_LABELS]
+            if not buttons:
+                return False
+            buttons[0].click()
+            wait_for(self.browser, portal_idle(), "reset")
+
+            kreditor = self.browser.find_element(*registry.locate(self.browser, "kreditor", config.OPUS_TIMING["reset"]))
+            return not kreditor.get_attribute("value")
+
+        except WebDriverException as e:
+            self.orchestrator_connection.log_trace(f"Resetting the OPUS form failed, navigating instead: {e.msg}")
+            return False
+
+    def _record(self, kind: str, start: float) -> None:
+        duration = time.perf_counter() - start
+        self.timings[kind].append(duration)
+        timings.record(f"opus_{kind}", duration)
+        self.orchestrator_connection.log_trace(f"OPUS {kind} took {duration:.2f}s.")
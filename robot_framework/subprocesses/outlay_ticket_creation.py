@@ -1,156 +1,125 @@
 """This module contains the logic for creating an outlay ticket in OPUS."""
-import json
 import os
 import time
-from pynput.keyboard import Key, Controller
-from mbu_dev_shared_components.utils.fernet_encryptor import Encryptor
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.keys import Keys
+from selenium.common.exceptions import TimeoutException
 
+from robot_framework import config
+from robot_framework.subprocesses.opus_selectors import registry
+from robot_framework.subprocesses import opus_interaction as interaction
+from robot_framework.timing import timed
 
-def initialize_browser(opus_username, opus_password):
-    """Initialize the Selenium Chrome WebDriver."""
+
+# Unified Rendering busy indicators shown by Web Dynpro while a server roundtrip is running.
+BUSY_INDICATOR_SELECTOR = "#ur-loading, .urBusyIndicator, .lsBusyIndicator, .lsLoadingIndicator"
+
+
+def initialize_browser(profile_dir: str | None = None):
+    """Initialize the Selenium Chrome WebDriver. Logging in is left to the first navigation.
+
+    Args:
+        profile_dir: A persistent profile directory to use, or None for a fresh incognito profile.
+    """
     chrome_options = Options()
     prefs = {
         "safebrowsing.enabled": False
     }
 
     chrome_options.add_experimental_option("prefs", prefs)
+    chrome_options.page_load_strategy = config.BROWSER_PAGE_LOAD_STRATEGY
     chrome_options.add_argument("test-type")
     chrome_options.add_argument("--start-maximized")
     chrome_options.add_argument("--disable-web-security")
     chrome_options.add_argument("--allow-running-insecure-content")
     chrome_options.add_argument("--disable-search-engine-choice-screen")
-    chrome_options.add_argument("--incognito")
+    if profile_dir:
+        chrome_options.add_argument(f"--user-data-dir={os.path.abspath(profile_dir)}")
+        chrome_options.add_argument("--no-first-run")
+    else:
+        chrome_options.add_argument("--incognito")
+    if config.BROWSER_HEADLESS:
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--window-size=1920,1080")
 
     browser = webdriver.Chrome(options=chrome_options)
-
-    login_to_opus(browser, opus_username, opus_password)
-
+    if config.BROWSER_BLOCKED_URLS:
+        browser.execute_cdp_cmd("Network.enable", {})
+        browser.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(config.BROWSER_BLOCKED_URLS)})
     return browser
 
 
-def click_element_with_retries(browser, by, value, retries=4):
-    """Click an element with retries and handle common exceptions."""
-    for attempt in range(retries):
-        try:
-            element = WebDriverWait(browser, 2).until(
-                EC.element_to_be_clickable((by, value))
-            )
-            element.click()
-            return True
-        except Exception as e:  # pylint: disable=broad-except
-            print(f"Attempt {attempt + 1} failed: {e}")
-            time.sleep(1)
-    return False
+def handle_opus(record, attachment_path, session, orchestrator_connection) -> str:
+    """Handle the OPUS ticket creation process.
 
+    Returns:
+        OPUS' confirmation of the created ticket.
+    """
 
-def decrypt_cpr(element_data):
-    """Decrypt the CPR number from the element data."""
-    encryptor = Encryptor()
-    encrypted_cpr = element_data['cpr_encrypted']
+    interaction.start_ticket()
+    try:
+        browser = session.open_form()
+        fill_form(browser, record)
+        upload_attachment(browser, attachment_path)
 
-    return encryptor.decrypt(encrypted_cpr.encode('utf-8'))
-
-
-def handle_opus(queue_element, path, browser, orchestrator_connection):
-    """Handle the OPUS ticket creation process."""
-
-    element_data = json.loads(queue_element.data)
-    attachment_path = os.path.join(path, f'receipt_{element_data["uuid"]}.pdf')
-
-    navigate_to_opus(browser)
-    fill_form(browser, element_data)
-    upload_attachment(browser, attachment_path)
-
-    complete_form_and_submit(browser, element_data)
+        confirmation = complete_form_and_submit(browser, record)
+        session.submitted()
+    finally:
+        interaction.end_ticket()
 
     orchestrator_connection.log_trace("Successfully created outlay ticket.")
     print("Successfully created outlay ticket.")
+    return confirmation
+
+
+def login_required(browser) -> bool:
+    """Whether the portal shows its logon page, i.e. the browser has no session or it has expired."""
+    return bool(browser.find_elements(By.ID, 'logonuidfield'))
 
 
 def login_to_opus(browser, username, password):
-    """Login to OPUS."""
-    browser.get("https://portal.kmd.dk/irj/portal")
+    """Login to OPUS from the portal's logon page."""
     wait_and_click(browser, By.ID, 'logonuidfield')
     enter_text(browser, By.ID, 'logonuidfield', {username})
     enter_text(browser, By.ID, 'logonpassfield', {password})
     wait_and_click(browser, By.ID, 'buttonLogon')
 
 
+@timed("navigate_to_opus")
 def navigate_to_opus(browser):
-    """Navigate to OPUS page and open required tabs."""
-    browser.get("https://portal.kmd.dk/irj/portal")
-    wait_and_click(browser, By.XPATH, "//div[text()='Min Økonomi']")
-    wait_and_click(browser, By.XPATH, "//div[text()='Bilag og fakturaer']")
-    wait_and_click(browser, By.XPATH, "/html/body/div[1]/table/tbody/tr[1]/td/div/div[1]/div[9]/div[2]/span[2]")
+    """Open the outlay form from the portal's start page."""
+    click_field(browser, "min_oekonomi")
+    click_field(browser, "bilag_og_fakturaer")
+    click_field(browser, "udgiftsbilag")
 
 
-def fill_form(browser, element_data):
-    """Fill out the form with data from element_data."""
+@timed("fill_form")
+def fill_form(browser, record):
+    """Fill out the form with data from the element record."""
     browser.switch_to.default_content()
     switch_to_frame(browser, 'contentAreaFrame')
     switch_to_frame(browser, 'ivuFrm_page0ivu0')
-    root_xpath = "/html/body/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr[2]/td/div/div/table/tbody/tr[2]/td/table/tbody/tr/td/div/div[1]/div/div/div/table/tbody/tr[1]/td/div/div/table/tbody/tr/td[1]/div/div/table/tbody/tr/td/div/div/table/tbody/"
-    enter_text(
-        browser,
-        By.XPATH,
-        root_xpath + "tr[2]/td/div/div/table/tbody/tr/td[1]/div/div/table/tbody/tr[1]/td[2]/div/div/table/tbody/tr/td[1]/span/input",
-        decrypt_cpr(element_data),
-    )  # Kreditor
-    wait_and_click(
-        browser,
-        By.XPATH,
-        root_xpath + "tr[2]/td/div/div/table/tbody/tr/td[1]/div/div/table/tbody/tr[1]/td[2]/div/div/table/tbody/tr/td[2]/div",
-    )  # Hent button
-    time.sleep(3)
+    fill_field(browser, "kreditor", record.cpr)
+    click_field(browser, "hent")
+    wait_for(browser, portal_idle(), "hent")
 
-    enter_text(
-        browser,
-        By.XPATH,
-        root_xpath + "tr[3]/td/div/div/table/tbody/tr[1]/td[1]/div/div/table/tbody/tr/td/div/div/table/tbody/tr[1]/td[2]/span/input",
-        element_data["posteringstekst"],
-    )  # Udbetalingstekst
-    enter_text(
-        browser,
-        By.XPATH,
-        root_xpath + "tr[3]/td/div/div/table/tbody/tr[2]/td/div/div/table/tbody/tr[2]/td[2]/span/input",
-        element_data["posteringstekst"],
-    )  # Posteringstekst
-    enter_text(
-        browser,
-        By.XPATH,
-        root_xpath + "tr[3]/td/div/div/table/tbody/tr[2]/td/div/div/table/tbody/tr[3]/td[2]/span/input",
-        element_data["reference"],
-    )  # Reference
-    enter_text(
-        browser,
-        By.XPATH,
-        root_xpath + "tr[3]/td/div/div/table/tbody/tr[2]/td/div/div/table/tbody/tr[4]/td[2]/div/div/table/tbody/tr/td[1]/span/input",
-        element_data["beloeb"],
-    )  # Beløb
-    enter_text(
-        browser,
-        By.XPATH,
-        root_xpath + "tr[4]/td/div/div/table/tbody/tr[2]/td[2]/div/div/table/tbody/tr[1]/td[1]/span/input",
-        element_data["naeste_agent"],
-    )  # Næste agent
+    fill_field(browser, "udbetalingstekst", record.posteringstekst)
+    fill_field(browser, "posteringstekst", record.posteringstekst)
+    fill_field(browser, "reference", record.reference)
+    fill_field(browser, "beloeb", record.beloeb)
+    fill_field(browser, "naeste_agent", record.naeste_agent)
 
     # Click item next to "udbeatlingstekst" to add column with child name
-    wait_and_click(
-        browser,
-        By.XPATH,
-        root_xpath + "tr[3]/td/div/div/table/tbody/tr[1]/td[1]/div/div/table/tbody/tr/td/div/div/table/tbody/tr[1]/td[3]/div",
-    )
+    click_field(browser, "udbetalingstekst_detaljer")
     browser.switch_to.default_content()  # Popup is not appearing on current frame
     switch_to_frame(browser, "URLSPW-0")  # Switch to popup
     # Type text at cursor (element id is dynamic but cursor always starts at next empty line)
     actions = ActionChains(browser)
-    actions.send_keys(element_data["barnets_navn"])
+    actions.send_keys(record.barnets_navn)
     actions.perform()
     # Click "Gem"
     # Find all buttons in frame:
@@ -165,36 +134,51 @@ def fill_form(browser, element_data):
     switch_to_frame(browser, "ivuFrm_page0ivu0")
 
 
+@timed("upload_attachment")
 def upload_attachment(browser, attachment_path):
     """Upload the attachment file to the browser form."""
-    wait_and_click(browser, By.XPATH, '/html/body/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr[2]/td/div/div/table/tbody/tr[2]/td/table/tbody/tr/td/div/div[1]/div/div/div/table/tbody/tr[1]/td/div/div/table/tbody/tr/td[2]/table/tbody/tr/td/div/table/tbody/tr[3]/td/div/span/span/div/span/span[1]/table/thead/tr[2]/th/div/div/div/span/div')  # Click 'Vedhæft nyt' button
-    WebDriverWait(browser, 20).until(
-        lambda driver: driver.execute_script("return document.readyState") == "complete"
-    )
+    click_field(browser, "vedhaeft_nyt")
+    browser.switch_to.default_content()
+    wait_for(browser, EC.frame_to_be_available_and_switch_to_it((By.ID, 'URLSPW-0')), "popup")
+    wait_for(browser, portal_idle(), "popup")
+    choose_file(browser, attachment_path)  # 'Vælg fil' without opening the native file dialog
+    wait_for(browser, file_selected, "file_selected")
+
+    click_field(browser, "vedhaeft_ok")
     browser.switch_to.default_content()
-    switch_to_frame(browser, 'URLSPW-0')
-    wait_and_click(browser, By.XPATH, '/html/body/table/tbody/tr/td/div/div[1]/div/div[3]/table/tbody/tr/td/div/div/span/span[2]/form')  # Click 'Vælg fil' button
+    wait_for(browser, EC.invisibility_of_element_located((By.ID, 'URLSPW-0')), "popup_closed")
+
 
-    time.sleep(4)
-    keyboard = Controller()
-    keyboard.type(attachment_path)
-    time.sleep(2)
-    keyboard.press(Key.enter)
-    keyboard.release(Key.enter)
-    time.sleep(2)
+def choose_file(browser, file_path):
+    """Set the file of the file input in the current frame directly through WebDriver.
+    The input is made visible first if the portal hides it behind its own button.
+    """
+    file_input = wait_for(browser, EC.presence_of_element_located((By.CSS_SELECTOR, "input[type=file]")), "popup")
+    if not file_input.is_displayed():
+        browser.execute_script("arguments[0].style.display = 'block'; arguments[0].style.visibility = 'visible';", file_input)
+    file_input.send_keys(file_path)
 
-    wait_and_click(browser, By.XPATH, '/html/body/table/tbody/tr/td/div/div[1]/div/div[4]/div/table/tbody/tr/td[3]/table/tbody/tr/td[1]/div')  # Click 'OK' button
-    time.sleep(2)
 
+def type_in_grid(browser, *cells):
+    """Type into consecutive grid cells starting at the focused cell, pressing TAB between cells.
+    A cell of None is skipped without typing.
+    """
+    actions = ActionChains(browser)
+    for i, text in enumerate(cells):
+        if i > 0:
+            actions.send_keys(Keys.TAB)
+        if text is not None:
+            actions.send_keys(text)
+    actions.perform()
 
-def press_key(keyboard, key):
-    """Press and release a key on the keyboard."""
-    keyboard.press(key)
-    keyboard.release(key)
 
+@timed("complete_form_and_submit")
+def complete_form_and_submit(browser, record) -> str:
+    """Complete the form and submit the ticket.
 
-def complete_form_and_submit(browser, element_data):
-    """Complete the form and submit the ticket."""
+    Returns:
+        OPUS' confirmation of the created ticket.
+    """
 
     from robot_framework.exceptions import BusinessError
 
@@ -202,53 +186,105 @@ def complete_form_and_submit(browser, element_data):
     switch_to_frame(browser, 'contentAreaFrame')
     switch_to_frame(browser, 'ivuFrm_page0ivu0')
 
-    keyboard = Controller()
-
-    wait_and_click(browser, By.XPATH, '/html/body/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr[2]/td/div/div/table/tbody/tr[2]/td/table/tbody/tr/td/div/div[1]/div/div/div/table/tbody/tr[2]/td/div/span/span[1]/div/span/span[1]/div/div/div/span/span/table/tbody/tr[2]/td/div/table/tbody/tr/td/div/table/tbody/tr[1]/td/table/tbody/tr[2]/td[3]/table/tbody/tr/td/span')
-    keyboard.type(element_data['arts_konto'])  # Artskonto
-
-    press_key(keyboard, Key.tab)
-    keyboard.type(element_data['beloeb'])  # Beløb
-
-    press_key(keyboard, Key.tab)
-    press_key(keyboard, Key.tab)
-    press_key(keyboard, Key.tab)
-    keyboard.type(element_data['psp'])  # PSP
-
-    press_key(keyboard, Key.tab)
-    keyboard.type(element_data['posteringstekst'])  # Posteringstekst
+    click_field(browser, "artskonto_celle")
+    type_in_grid(
+        browser,
+        record.arts_konto,  # Artskonto
+        record.beloeb,  # Beløb
+        None,
+        None,
+        record.psp,  # PSP
+        record.posteringstekst,  # Posteringstekst
+    )
 
-    time.sleep(1)
+    wait_for(browser, portal_idle(), "grid")
 
-    wait_and_click(browser, By.XPATH, '/html/body/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr[1]/td/div/div[2]/div/div/div/span[4]/div')  # Click 'Kontroller' button
-    time.sleep(4)
+    click_field(browser, "kontroller")
 
     # Check for business error here
-    if not browser.find_elements(By.XPATH, "//*[contains(text(), 'Udgiftsbilag er kontrolleret og OK')]"):
+    if not wait_for_text(browser, 'Udgiftsbilag er kontrolleret og OK', "kontroller"):
         raise BusinessError("Fejl ved kontrol af udgiftsbilag.")
 
-    wait_and_click(browser, By.XPATH, '/html/body/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr/td/div/table/tbody/tr[1]/td/div/div[2]/div/div/div/span[1]/div')  # Click 'Opret' button
-    time.sleep(4)
-    if not browser.find_elements(By.XPATH, "//*[contains(text(), 'er oprettet')]"):
-        time.sleep(1)
+    click_field(browser, "opret")
+    confirmation = wait_for_text(browser, 'er oprettet', "opret")
+    if not confirmation:
         raise BusinessError("Fejl ved oprettelse af udgiftsbilag, kontrol OK.")
+    return confirmation
 
 
 def switch_to_frame(browser, frame):
     """Switch to the required frames to access the form."""
-    WebDriverWait(browser, 30).until(EC.frame_to_be_available_and_switch_to_it((By.ID, frame)))
+    interaction.wait_until(browser, EC.frame_to_be_available_and_switch_to_it((By.ID, frame)), config.STEP_TIMEOUT, f"frame {frame}")
 
 
-def enter_text(browser, by, value, text):
+def enter_text(browser, by, value, text, step=None):
     """Helper to enter text into a form element."""
-    input_element = WebDriverWait(browser, 30).until(
-        EC.presence_of_element_located((by, value))
-    )
-    input_element.send_keys(text)
+    interaction.type_text(browser, by, value, text, step=step or value)
+
 
+def click_field(browser, name):
+    """Click a field from the selector registry."""
+    wait_and_click(browser, *registry.locate(browser, name, interaction.remaining(config.SELECTOR_TIMEOUT)), step=name)
+
+
+def fill_field(browser, name, text):
+    """Enter text into a field from the selector registry."""
+    enter_text(browser, *registry.locate(browser, name, interaction.remaining(config.SELECTOR_TIMEOUT)), text, step=name)
+
+
+def wait_and_click(browser, by, value, step=None):
+    """Wait for an element to be clickable, then click it. Raises if that doesn't happen within the step timeout."""
+    interaction.click(browser, by, value, step or value)
+
+
+def wait_for(browser, condition, step):
+    """Wait for a condition using the timeout of the given step in config.OPUS_TIMING."""
+    return interaction.wait_until(browser, condition, config.OPUS_TIMING[step], step)
+
+
+def wait_for_text(browser, text, step) -> str | None:
+    """Wait for an element containing the text in the current frame, or for the portal to finish the roundtrip
+    without showing it, as it does when OPUS rejects the form. Returns the element's text, or None if it didn't appear.
+    """
+    locator = (By.XPATH, f"//*[contains(text(), '{text}')]")
+    try:
+        wait_for(browser, EC.any_of(EC.presence_of_element_located(locator), portal_idle()), step)
+    except interaction.TicketBudgetExceeded:
+        raise
+    except TimeoutException:
+        return None
+
+    elements = browser.find_elements(*locator)
+    return elements[0].get_attribute("textContent").strip() if elements else None
+
+
+def file_selected(browser) -> bool:
+    """Whether a file has been chosen in a file input of the current frame."""
+    return browser.execute_script(
+        "return Array.from(document.querySelectorAll('input[type=file]')).some(i => i.files.length > 0);"
+    )
 
-def wait_and_click(browser, by, value):
-    """Wait for an element to be clickable, then click it."""
 
-    WebDriverWait(browser, 50).until(EC.presence_of_element_located((by, value)))
-    click_element_with_retries(browser, by, value)
+def portal_idle():
+    """Create a wait condition that is true once the page is loaded and no Web Dynpro busy indicator
+    has been visible for config.OPUS_TIMING['settle'] seconds.
+    The settle time covers the gap between a click and the busy indicator appearing.
+    """
+    idle_since = None
+
+    def condition(browser) -> bool:
+        nonlocal idle_since
+        idle = browser.execute_script(
+            "return document.readyState === 'complete' && "
+            "!Array.from(document.querySelectorAll(arguments[0])).some(e => e.offsetParent !== null);",
+            BUSY_INDICATOR_SELECTOR
+        )
+        if not idle:
+            idle_since = None
+            return False
+
+        if idle_since is None:
+            idle_since = time.monotonic()
+        return time.monotonic() - idle_since >= config.OPUS_TIMING["settle"]
+
+    return condition
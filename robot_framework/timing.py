@@ -0,0 +1,119 @@
+"""This module contains the stage timers of the run and the run summary built from them.
+
+Wrap a stage in `with timings.span("name"):` or decorate its function with `@timed("name")`.
+At the end of the run `timings.report` logs p50/p95/max per stage and the throughput,
+and appends the same summary as one JSON line to a file, so runs can be compared over time.
+"""
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+
+# The stage that is timed once per attempt at an element. Its spans without errors are the completed
+# elements the throughput is counted from, so retries and released elements don't inflate it.
+ELEMENT_STAGE = "process_single_queue_element"
+
+
+class Timings:
+    """Durations of the timed stages of the run, shared by all workers."""
+
+    def __init__(self):
+        self._durations: dict[str, list[float]] = {}
+        self._errors: dict[str, int] = {}
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the run clock and forget earlier durations."""
+        with self._lock:
+            self._durations.clear()
+            self._errors.clear()
+            self._started = time.monotonic()
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time the block as a stage. A block that raises is timed too, and counted as an error."""
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start, failed)
+
+    def record(self, stage: str, duration: float, failed: bool = False) -> None:
+        """Record a duration of a stage measured elsewhere."""
+        with self._lock:
+            self._durations.setdefault(stage, []).append(duration)
+            if failed:
+                self._errors[stage] = self._errors.get(stage, 0) + 1
+
+    def summary(self) -> dict:
+        """The run summary: elapsed time, completed elements and elements/hour, and count, errors, p50, p95 and max per stage."""
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            elements = len(self._durations.get(ELEMENT_STAGE, [])) - self._errors.get(ELEMENT_STAGE, 0)
+            stages = {
+                stage: {
+                    "count": len(durations),
+                    "errors": self._errors.get(stage, 0),
+                    "p50": round(_percentile(durations, 50), 3),
+                    "p95": round(_percentile(durations, 95), 3),
+                    "max": round(max(durations), 3),
+                }
+                for stage, durations in sorted(self._durations.items())
+            }
+        return {
+            "finished": datetime.now().isoformat(timespec="seconds"),
+            "elapsed": round(elapsed, 1),
+            "elements": elements,
+            "elements_per_hour": round(elements * 3600 / elapsed, 1) if elapsed > 0 else 0.0,
+            "stages": stages,
+        }
+
+    def report(self, orchestrator_connection: OrchestratorConnection, path: str) -> None:
+        """Log the run summary and append it as a JSON line to the file at path."""
+        summary = self.summary()
+        summary["process_name"] = orchestrator_connection.process_name
+
+        orchestrator_connection.log_info(
+            f"Run summary: {summary['elements']} elements completed in {summary['elapsed']:.0f}s, {summary['elements_per_hour']} elements/hour."
+        )
+        for stage, stats in summary["stages"].items():
+            orchestrator_connection.log_info(
+                f"Stage '{stage}': {stats['count']} runs, {stats['errors']} errors, "
+                f"p50 {stats['p50']:.2f}s, p95 {stats['p95']:.2f}s, max {stats['max']:.2f}s."
+            )
+
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(summary) + "\n")
+        except OSError as e:
+            orchestrator_connection.log_error(f"Writing the run summary to {path} failed: {e}")
+
+
+timings = Timings()
+
+
+def timed(stage: str):
+    """Decorate a function to time every call to it as a stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timings.span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _percentile(durations: list[float], percent: float) -> float:
+    """The nearest-rank percentile of the durations."""
+    ordered = sorted(durations)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
@@ -0,0 +1,102 @@
+"""This module contains the workbook patcher, which changes single cells of a workbook with openpyxl.
+
+The header row and the key column are read once into an index from key to rows, and a patch only touches
+the cells it sets. Columns that are missing are added after the last column of the header. Cell values,
+styles and column widths of the rest of the sheet are kept as openpyxl read them, and the workbook
+is saved to a temporary file that is moved into place, so a crash never leaves a half-written file.
+Other robots write to the same workbooks, so the workbook is read again whenever its modification time
+or size changed since it was read or saved, also right before saving, and the unsaved patches are applied
+to the fresh copy.
+"""
+import os
+
+# openpyxl is imported when a workbook is opened, so runs without marks never load it.
+
+
+# pylint: disable-next = too-many-instance-attributes
+class WorkbookPatcher:
+    """The first sheet of a workbook, indexed by a key column, with pending cell changes."""
+
+    def __init__(self, workbook_path: str, key_column: str = 'uuid'):
+        """
+        Args:
+            workbook_path: The workbook to patch.
+            key_column: The header of the column that identifies the rows.
+
+        Raises:
+            ValueError: If the sheet has no key column.
+        """
+        self.workbook_path = workbook_path
+        self.key_column = key_column
+        self._changes: dict[tuple[str, str], object] = {}
+        self._read()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def refresh(self) -> None:
+        """Read the workbook again if another process changed it since it was read or saved.
+        Cells set since the last save are set again in the fresh copy.
+        """
+        if self._stat() != self._read_stat:
+            self._read()
+
+    def set(self, key: str, column: str, value) -> None:
+        """Set a column in every row with the key, adding the column if the sheet doesn't have it."""
+        self._changes[(key, column)] = value
+        self._apply(key, column, value)
+
+    def save(self) -> None:
+        """Save the workbook if any cell changed, after reading it again if another process changed it."""
+        self.refresh()
+        if not self._dirty:
+            self._changes.clear()
+            return
+        base, ext = os.path.splitext(self.workbook_path)
+        tmp_path = f"{base}.tmp{ext}"
+        self._workbook.save(tmp_path)
+        os.replace(tmp_path, self.workbook_path)
+        self._dirty = False
+        self._changes.clear()
+        self._read_stat = self._stat()
+
+    def _apply(self, key: str, column: str, value) -> None:
+        column_index = self._column(column)
+        for row in self._index.get(key, ()):
+            cell = self._sheet.cell(row=row, column=column_index)
+            if cell.value != value:
+                cell.value = value
+                self._dirty = True
+
+    def _read(self) -> None:
+        import openpyxl
+
+        self._read_stat = self._stat()
+        self._workbook = openpyxl.load_workbook(self.workbook_path)
+        self._sheet = self._workbook.worksheets[0]
+        self._columns = {
+            str(cell.value): cell.column for cell in self._sheet[1] if cell.value is not None
+        }
+        if self.key_column not in self._columns:
+            raise ValueError(f"{self.workbook_path} has no '{self.key_column}' column.")
+
+        key_index = self._columns[self.key_column]
+        self._index: dict[str, list[int]] = {}
+        for (cell,) in self._sheet.iter_rows(min_row=2, min_col=key_index, max_col=key_index):
+            if cell.value is not None:
+                self._index.setdefault(str(cell.value), []).append(cell.row)
+        self._dirty = False
+        for (key, column), value in self._changes.items():
+            self._apply(key, column, value)
+
+    def _stat(self) -> tuple[int, int]:
+        stat = os.stat(self.workbook_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _column(self, column: str) -> int:
+        if column not in self._columns:
+            column_index = self._sheet.max_column + 1
+            self._sheet.cell(row=1, column=column_index, value=column)
+            self._columns[column] = column_index
+            self._dirty = True
+        return self._columns[column]
@@ -0,0 +1,138 @@
+"""Tests of the reconciliation command against local workbooks, a stub queue and an SQLite stand-in for the database."""
+import argparse
+import json
+import sqlite3
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import openpyxl
+import pytest
+
+from robot_framework import reconcile
+
+QUERY = "SELECT form_id, status FROM journalizing.Journalizing"
+
+# uuid: (behandlet_ok, behandlet_fejl)
+WORKBOOKS = {
+    "first.xlsx": {
+        "ok": ("x", None),
+        "duplicate": ("x", None),
+        "requeue": (None, None),
+        "contradicts_queue": ("x", None),
+        "db_missing": ("x", None),
+        "conflict": ("x", "x"),
+        "not_marked": (None, None),
+    },
+    "second.xlsx": {
+        "duplicate": ("x", None),
+        "db_contradicts": (None, "x"),
+        "waiting": (None, None),
+        "running": (None, None),
+        "no_queue": ("x", None),
+    },
+}
+
+QUEUE = {
+    "ok": "DONE",
+    "duplicate": "DONE",
+    "contradicts_queue": "FAILED",
+    "db_missing": "DONE",
+    "conflict": "DONE",
+    "not_marked": "DONE",
+    "db_contradicts": "FAILED",
+    "waiting": "NEW",
+    "running": "IN_PROGRESS",
+    "queue_only": "DONE",
+}
+
+DB_STATUSES = {
+    "ok": "Successful",
+    "duplicate": "Successful",
+    "contradicts_queue": "Successful",
+    "db_missing": "InProgress",
+    "conflict": "Successful",
+    "not_marked": "Successful",
+    "db_contradicts": "Successful",
+    "no_queue": "Successful",
+}
+
+
+class StubOrchestrator:  # pylint: disable=too-few-public-methods
+    """Serves the queue elements in pages like OpenOrchestrator does."""
+
+    def __init__(self, statuses: dict[str, str]):
+        created = datetime(2025, 1, 1)
+        self.elements = [
+            SimpleNamespace(data=json.dumps({"uuid": uuid}), status=SimpleNamespace(name=status),
+                            created_date=created + timedelta(minutes=i), message=None)
+            for i, (uuid, status) in enumerate(statuses.items())
+        ]
+        # An older element of a form that was queued again, which the newest element must win over
+        self.elements.append(SimpleNamespace(data=json.dumps({"uuid": "waiting"}), status=SimpleNamespace(name="FAILED"),
+                                             created_date=created - timedelta(days=1), message=None))
+
+    def get_queue_elements(self, queue_name, offset, limit):  # pylint: disable=unused-argument
+        """A page of the queue's elements."""
+        return self.elements[offset:offset + limit]
+
+
+@pytest.fixture(name="report")
+def fixture_report(tmp_path, monkeypatch):
+    """The reconciliation of two fixture workbooks with the stub queue and an SQLite status table."""
+    for name, rows in WORKBOOKS.items():
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(["uuid", "navn", "behandlet_ok", "behandlet_fejl"])
+        for uuid, (ok, failed) in rows.items():
+            sheet.append([uuid, f"Navn {uuid}", ok, failed])
+        workbook.save(tmp_path / name)
+
+    db_path = tmp_path / "journalizing.db"
+    with sqlite3.connect(db_path) as db:
+        db.execute("CREATE TABLE Journalizing (form_id TEXT, status TEXT)")
+        db.executemany("INSERT INTO Journalizing VALUES (?, ?)", DB_STATUSES.items())
+
+    monkeypatch.setattr(reconcile, "QUEUE_PAGE_SIZE", 3)
+    connection = reconcile._connect_db(argparse.Namespace(sqlite=str(db_path)), None)  # pylint: disable=protected-access
+    try:
+        return reconcile.reconcile(reconcile.load_workbooks(str(tmp_path)), reconcile.load_queue(StubOrchestrator(QUEUE)),
+                                   reconcile.load_db_statuses(connection, QUERY))
+    finally:
+        connection.close()
+
+
+def test_classifies_each_discrepancy(report):
+    """Every row gets the first discrepancy that applies to it, and consistent rows get none."""
+    issues = {(row.uuid, row.workbook if isinstance(row.workbook, str) else None): row.issue for row in report.itertuples()}
+
+    assert issues == {
+        ("ok", "first.xlsx"): "",
+        ("duplicate", "first.xlsx"): "duplicate_in_workbooks",
+        ("duplicate", "second.xlsx"): "duplicate_in_workbooks",
+        ("requeue", "first.xlsx"): "not_in_queue",
+        ("contradicts_queue", "first.xlsx"): "excel_contradicts_queue",
+        ("db_missing", "first.xlsx"): "db_not_written",
+        ("conflict", "first.xlsx"): "marked_ok_and_failed",
+        ("not_marked", "first.xlsx"): "excel_not_marked",
+        ("db_contradicts", "second.xlsx"): "db_contradicts_excel",
+        ("waiting", "second.xlsx"): "",
+        ("running", "second.xlsx"): "in_progress",
+        ("no_queue", "second.xlsx"): "not_in_queue",
+        ("queue_only", None): "not_in_workbooks",
+    }
+
+
+def test_reads_statuses_and_rows(report):
+    """The statuses of all three systems and the Excel row number are read, and the newest queue element wins."""
+    row = report[report["uuid"] == "db_contradicts"].iloc[0]
+
+    assert (row["excel_status"], row["queue_status"], row["db_status"], row["row"]) == ("failed", "FAILED", "ok", 3)
+    assert report[report["uuid"] == "waiting"].iloc[0]["queue_status"] == "NEW"
+
+
+def test_requeue_list_holds_only_unhandled_forms_without_a_live_element(report):
+    """Only forms no system has handled and without a waiting or running element are re-queued."""
+    requeue = reconcile.requeue_list(report)
+
+    assert requeue["uuid"].tolist() == ["requeue"]
+    assert requeue.iloc[0]["workbook"] == "first.xlsx"